@@ -3,20 +3,31 @@ import axios from "axios";
 import Navbar from "../../components/Navbar";
 import { useNavigate } from "react-router-dom";
 
-type Patient = {
+type RecentPatient = {
   id: number;
   full_name: string;
   age: number;
   gender: string;
   mrn?: string | null;
-  medical_history?: string | null;
-  risk_factors?: string | null;
+};
+
+type DashboardSummary = {
+  patients: {
+    total: number;
+    by_gender: Record<string, number>;
+    by_age_band: Record<string, number>;
+  };
+  tickets: {
+    total: number;
+    by_status: Record<string, number>;
+  };
+  recent_patients: RecentPatient[];
 };
 
 export default function Dashboard() {
   const navigate = useNavigate();
 
-  const [patients, setPatients] = useState<Patient[]>([]);
+  const [summary, setSummary] = useState<DashboardSummary | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
@@ -24,38 +35,43 @@ export default function Dashboard() {
   const token = localStorage.getItem("token");
 
   useEffect(() => {
-    const fetchPatients = async () => {
+    const fetchSummary = async () => {
       if (!token) {
         navigate("/login");
         return;
       }
 
       try {
-        const res = await axios.get<Patient[]>(`${API}/api/patients`, {
-          headers: {
-            Authorization: `Bearer ${token}`,
-          },
-        });
-        setPatients(res.data);
+        // Aggregates are computed server-side; no need to pull every patient.
+        const res = await axios.get<DashboardSummary>(
+          `${API}/api/dashboard/summary`,
+          {
+            params: { recent: 3 },
+            headers: {
+              Authorization: `Bearer ${token}`,
+            },
+          }
+        );
+        setSummary(res.data);
       } catch (err: any) {
         console.error(
-          "DASHBOARD FETCH PATIENTS ERROR:",
+          "DASHBOARD FETCH SUMMARY ERROR:",
           err.response?.data || err.message
         );
-        setError("Failed to load patients.");
+        setError("Failed to load dashboard summary.");
       } finally {
         setLoading(false);
       }
     };
 
-    fetchPatients();
+    fetchSummary();
   }, [API, token, navigate]);
 
-  const totalPatients = patients.length;
+  const totalPatients = summary?.patients.total ?? 0;
   const totalPredictions = 78; // placeholder for now
   const todaysNewCases = 3; // placeholder for now
 
-  const recentPatients = [...patients].reverse().slice(0, 3);
+  const recentPatients = summary?.recent_patients ?? [];
 
   return (
     <div className="min-h-screen">
@@ -13,6 +13,10 @@ type PredictionResult = {
   prediction: string;
   probabilities: Record<string, number>;
   explainability?: any;
+  model_version?: string | null;
+  scan_id?: string | null;
+  thumbnail_url?: string | null;
+  preview_url?: string | null;
 };
 
 export default function NewPrediction() {
@@ -288,11 +292,27 @@ export default function NewPrediction() {
               Prediction Result
             </h2>
 
-            <div>
-              <p className="text-sm text-slate-600 mb-1">Predicted Stage</p>
-              <p className="text-2xl font-extrabold text-blue-700">
-                {result.prediction}
-              </p>
+            <div className="flex items-start gap-4">
+              {result.preview_url && (
+                <img
+                  src={`${API}${result.preview_url}`}
+                  alt="Analysed OCT scan"
+                  width={160}
+                  height={160}
+                  className="rounded-lg border border-slate-200 object-cover"
+                />
+              )}
+              <div>
+                <p className="text-sm text-slate-600 mb-1">Predicted Stage</p>
+                <p className="text-2xl font-extrabold text-blue-700">
+                  {result.prediction}
+                </p>
+                {result.model_version && (
+                  <p className="text-[11px] mt-1 text-slate-500">
+                    Model: {result.model_version}
+                  </p>
+                )}
+              </div>
             </div>
 
             {result.probabilities && (
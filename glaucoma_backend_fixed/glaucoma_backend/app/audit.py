@@ -0,0 +1,358 @@
+# app/audit.py
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi import Request
+
+from app.auth.jwt_handler import verify_token
+from app.config import (
+    AUDIT_BACKPRESSURE_MS,
+    AUDIT_BATCH_SIZE,
+    AUDIT_BUFFER_SIZE,
+    AUDIT_DIR,
+    AUDIT_FLUSH_SECONDS,
+    AUDIT_SINK,
+)
+from app.database import SessionLocal
+from app.models import AuditEvent
+from app.traffic import route_template
+
+logger = logging.getLogger(__name__)
+
+# (method, route template) -> audited action. Anything not listed isn't audited.
+AUDITED_ROUTES: Dict[tuple, str] = {
+    ("GET", "/api/patients"): "patient.list",
+    ("POST", "/api/patients"): "patient.create",
+    ("GET", "/api/patients/{patient_id}"): "patient.read",
+    ("PUT", "/api/patients/{patient_id}"): "patient.update",
+    ("GET", "/api/patients/{patient_id}/report"): "patient.report",
+    ("POST", "/api/predict/"): "prediction.run",
+    ("POST", "/api/predict/volume"): "prediction.volume",
+    ("POST", "/api/jobs/predict"): "prediction.job",
+    ("POST", "/api/jobs/volume"): "prediction.job",
+}
+
+# request.state attribute through which a route names the patient it touched.
+AUDIT_PATIENT_ATTR = "audit_patient_id"
+
+
+# -------------------- sinks --------------------
+
+class DatabaseSink:
+    """Writes each batch to the audit_events table in a single transaction."""
+
+    def write(self, batch: List[dict]) -> None:
+        db = SessionLocal()
+        try:
+            db.bulk_insert_mappings(AuditEvent, batch)
+            db.commit()
+        finally:
+            db.close()
+
+    def query(self, patient_id=None, user=None, since=None, limit=100) -> List[dict]:
+        db = SessionLocal()
+        try:
+            q = db.query(AuditEvent)
+            if patient_id is not None:
+                q = q.filter(AuditEvent.patient_id == patient_id)
+            if user is not None:
+                q = q.filter(AuditEvent.user == user)
+            if since is not None:
+                q = q.filter(AuditEvent.ts >= since)
+            # Served by the (patient_id, ts) / (user, ts) indexes.
+            rows = q.order_by(AuditEvent.ts.desc()).limit(limit).all()
+            return [
+                {c.name: getattr(row, c.name) for c in AuditEvent.__table__.columns}
+                for row in rows
+            ]
+        finally:
+            db.close()
+
+
+class SegmentFileSink:
+    """
+    Appends each batch to JSON-lines segment files, fsynced per batch.
+
+    Segments are never rewritten; a new one starts once the current one
+    exceeds `segment_bytes`. A crash mid-write can leave a torn last line:
+    the next write starts on a fresh line, and queries skip anything that
+    isn't a complete, parseable line. Queries scan segments newest first
+    (there is no index), so prefer the database sink where queries matter.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        existing = sorted(self.directory.glob("audit-*.jsonl"))
+        self._seq = int(existing[-1].stem.split("-")[1]) if existing else 0
+
+    def _segment(self) -> Path:
+        path = self.directory / f"audit-{self._seq:06d}.jsonl"
+        if path.exists() and path.stat().st_size >= self.segment_bytes:
+            self._seq += 1
+            path = self.directory / f"audit-{self._seq:06d}.jsonl"
+        return path
+
+    def write(self, batch: List[dict]) -> None:
+        # default=str renders datetimes as "YYYY-MM-DD HH:MM:SS.ffffff", which sorts correctly.
+        lines = "".join(json.dumps(event, default=str) + "\n" for event in batch)
+        path = self._segment()
+        with open(path, "a") as fh:
+            if _ends_mid_line(path):
+                fh.write("\n")  # don't glue the first event onto a torn line
+            fh.write(lines)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def query(self, patient_id=None, user=None, since=None, limit=100) -> List[dict]:
+        results: List[dict] = []
+        for path in sorted(self.directory.glob("audit-*.jsonl"), reverse=True):
+            for event in reversed(_read_segment(path)):
+                if patient_id is not None and event.get("patient_id") != patient_id:
+                    continue
+                if user is not None and event.get("user") != user:
+                    continue
+                if since is not None and event["ts"] < str(since):
+                    continue
+                results.append(event)
+                if len(results) >= limit:
+                    return results
+        return results
+
+
+def _ends_mid_line(path: Path) -> bool:
+    with open(path, "rb") as fh:
+        fh.seek(0, os.SEEK_END)
+        if fh.tell() == 0:
+            return False
+        fh.seek(-1, os.SEEK_END)
+        return fh.read(1) != b"\n"
+
+
+def _read_segment(path: Path) -> List[dict]:
+    events = []
+    with open(path) as fh:
+        for lineno, line in enumerate(fh, 1):
+            if not line.endswith("\n") or not line.strip():
+                continue  # blank, or a write that never finished
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                logger.warning("Skipping unreadable audit record %s:%d", path.name, lineno)
+    return events
+
+
+# -------------------- buffer + flusher --------------------
+
+class AuditLog:
+    """
+    In-memory ring buffer of audit events drained by a group-commit thread.
+
+    Requests only append to the buffer; the flusher writes up to `batch_size`
+    events per transaction every `flush_seconds` (or sooner once a batch is
+    full), so auditing adds no synchronous write to the request path. At most
+    `flush_seconds` of events can be lost on a crash. When the buffer is
+    full, producers wait up to `backpressure_ms` for the flusher to catch up;
+    only then is the event dropped and counted.
+    """
+
+    def __init__(
+        self,
+        sink,
+        capacity: int = 10000,
+        batch_size: int = 500,
+        flush_seconds: float = 1.0,
+        backpressure_ms: int = 200,
+    ):
+        self.sink = sink
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.backpressure_ms = backpressure_ms
+        self._buffer: deque = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.written_total = 0
+        self.dropped_total = 0
+        self.failed_flushes = 0
+        self.last_flush: Optional[float] = None
+
+    def try_append(self, event: dict) -> bool:
+        with self._lock:
+            if len(self._buffer) >= self.capacity:
+                return False
+            self._buffer.append(event)
+            full_batch = len(self._buffer) >= self.batch_size
+        if full_batch:
+            self._wake.set()
+        return True
+
+    async def append(self, event: dict) -> None:
+        """Buffer `event`, applying backpressure to the calling request when full."""
+        deadline = time.monotonic() + self.backpressure_ms / 1000
+        while not self.try_append(event):
+            self._wake.set()
+            if time.monotonic() >= deadline:
+                self.dropped_total += 1
+                logger.warning("Audit buffer full; dropped an event (%d so far)", self.dropped_total)
+                return
+            await asyncio.sleep(0.005)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flusher after writing out everything still buffered."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            stopping = self._stop.is_set()
+            while self.flush() == self.batch_size:
+                pass  # keep draining full batches
+            if stopping:
+                return
+
+    def flush(self) -> int:
+        """Write one batch; returns how many events were written."""
+        with self._lock:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+        if not batch:
+            return 0
+        try:
+            self.sink.write(batch)
+        except Exception:
+            self.failed_flushes += 1
+            logger.exception("Writing %d audit events failed; will retry", len(batch))
+            with self._lock:
+                # Put them back in order, unless newer events have filled the buffer.
+                room = self.capacity - len(self._buffer)
+                self._buffer.extendleft(reversed(batch[:room]))
+                self.dropped_total += len(batch) - min(room, len(batch))
+            time.sleep(min(self.flush_seconds, 1.0))
+            return 0
+        self.written_total += len(batch)
+        self.last_flush = time.time()
+        return len(batch)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "sink": type(self.sink).__name__,
+            "buffered": len(self._buffer),
+            "capacity": self.capacity,
+            "written_total": self.written_total,
+            "dropped_total": self.dropped_total,
+            "failed_flushes": self.failed_flushes,
+            "last_flush": self.last_flush,
+        }
+
+
+# -------------------- request middleware --------------------
+
+class AuditMiddleware:
+    """
+    ASGI middleware that turns audited requests into `AuditLog` events.
+
+    The user comes from the bearer token, and the patient id from the path or,
+    where it isn't part of the path (uploads, newly created patients), from
+    what the route recorded with `audit_patient`. Requests to routes not in
+    AUDITED_ROUTES pass through untouched.
+    """
+
+    def __init__(self, app, log: AuditLog):
+        self.app = app
+        self.log = log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            action = AUDITED_ROUTES.get((scope["method"], route_template(scope)))
+            if action is not None:
+                await self.log.append(self._event(scope, action, status["code"], started))
+
+    def _event(self, scope, action: str, code: int, started: float) -> dict:
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        client = scope.get("client")
+        return {
+            "ts": datetime.utcnow(),
+            "user": _user_from_headers(headers),
+            "action": action,
+            "patient_id": _patient_id(scope),
+            "method": scope["method"],
+            "route": route_template(scope),
+            "status": code,
+            "client": client[0] if client else None,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+
+def _user_from_headers(headers: Dict[str, str]) -> Optional[str]:
+    auth = headers.get("authorization", "")
+    if not auth.lower().startswith("bearer "):
+        return None
+    payload = verify_token(auth[7:].strip())
+    return payload.get("sub") if payload else None
+
+
+def audit_patient(request: Request, patient_id) -> None:
+    """Record the patient a request concerns when it isn't a path parameter."""
+    setattr(request.state, AUDIT_PATIENT_ATTR, patient_id)
+
+
+def _patient_id(scope) -> Optional[int]:
+    value = (scope.get("path_params") or {}).get("patient_id")
+    if value is None:
+        # request.state is backed by scope["state"].
+        value = (scope.get("state") or {}).get(AUDIT_PATIENT_ATTR)
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def create_audit_log() -> AuditLog:
+    sink = SegmentFileSink(AUDIT_DIR) if AUDIT_SINK == "file" else DatabaseSink()
+    return AuditLog(
+        sink,
+        capacity=AUDIT_BUFFER_SIZE,
+        batch_size=AUDIT_BATCH_SIZE,
+        flush_seconds=AUDIT_FLUSH_SECONDS,
+        backpressure_ms=AUDIT_BACKPRESSURE_MS,
+    )
+
+
+audit_log = create_audit_log()
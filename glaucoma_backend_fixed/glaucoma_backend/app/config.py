@@ -6,3 +6,71 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./glaucoma.db")
 JWT_SECRET = os.getenv("JWT_SECRET", "supersecretkey123")
 JWT_ALGORITHM = "HS256"
+
+# Model registry: extra directory to scan for *.keras versions, the version served
+# at startup, and how much weight memory loaded versions may use before idle ones
+# are unloaded.
+MODEL_DIR = os.getenv("MODEL_DIR")
+MODEL_VERSION = os.getenv("MODEL_VERSION", "glaucoma_best_model_ft2")
+MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "2048"))
+
+# Let Pillow decode truncated image files instead of rejecting them in the
+# prediction quality gate.
+ALLOW_TRUNCATED_IMAGES = os.getenv("ALLOW_TRUNCATED_IMAGES", "false").lower() == "true"
+
+# OCT volume inference: slices per model.predict call (bounds peak memory) and
+# the largest volume accepted.
+VOLUME_BATCH_SIZE = int(os.getenv("VOLUME_BATCH_SIZE", "8"))
+VOLUME_MAX_SLICES = int(os.getenv("VOLUME_MAX_SLICES", "512"))
+
+# Asynchronous prediction jobs: SQLite queue file, where uploads are spooled,
+# worker threads per process (the job concurrency bound) and retry policy.
+# Jobs of a crashed worker are requeued when the server restarts; the lease
+# only matters when that can't be detected (e.g. on Windows).
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "./jobs.db")
+JOB_SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", "./job_spool")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "900"))
+
+# Admission control for /api/predict/: concurrent inferences, how many requests
+# may wait behind them, and the default / maximum per-request deadline.
+PREDICT_MAX_CONCURRENCY = int(os.getenv("PREDICT_MAX_CONCURRENCY", "1"))
+PREDICT_MAX_QUEUE_DEPTH = int(os.getenv("PREDICT_MAX_QUEUE_DEPTH", "16"))
+PREDICT_DEADLINE_SECONDS = float(os.getenv("PREDICT_DEADLINE_SECONDS", "30"))
+
+# Volumes (/api/predict/volume) get their own admission queue, costed per slice,
+# so a long volume neither blocks single images nor skews their estimates.
+# Volumes above VOLUME_SYNC_MAX_SLICES must go through POST /api/jobs/volume.
+VOLUME_MAX_CONCURRENCY = int(os.getenv("VOLUME_MAX_CONCURRENCY", "1"))
+VOLUME_MAX_QUEUE_DEPTH = int(os.getenv("VOLUME_MAX_QUEUE_DEPTH", "4"))
+VOLUME_DEADLINE_SECONDS = float(os.getenv("VOLUME_DEADLINE_SECONDS", "120"))
+VOLUME_SYNC_MAX_SLICES = int(os.getenv("VOLUME_SYNC_MAX_SLICES", "128"))
+
+# TensorFlow inference runtime. Thread counts of 0 mean "derive from the CPUs
+# available to this process divided by WEB_CONCURRENCY workers".
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+INFERENCE_INTRA_OP_THREADS = int(os.getenv("INFERENCE_INTRA_OP_THREADS", "0"))
+INFERENCE_INTER_OP_THREADS = int(os.getenv("INFERENCE_INTER_OP_THREADS", "0"))
+INFERENCE_ONEDNN = os.getenv("INFERENCE_ONEDNN", "auto")  # auto | on | off
+INFERENCE_XLA = os.getenv("INFERENCE_XLA", "false").lower() == "true"
+INFERENCE_PRECISION = os.getenv("INFERENCE_PRECISION", "float32")  # or mixed_bfloat16 / mixed_float16
+
+# Opt-in traffic capture for replay benchmarks (replay_traffic.py). Unset = off.
+TRAFFIC_CAPTURE_PATH = os.getenv("TRAFFIC_CAPTURE_PATH")
+TRAFFIC_CAPTURE_SAMPLE_RATE = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", "1.0"))
+
+# Access audit log. Events are buffered in memory (AUDIT_BUFFER_SIZE) and written
+# in batches every AUDIT_FLUSH_SECONDS, which bounds what a crash can lose.
+# AUDIT_SINK is "db" (audit_events table) or "file" (append-only segments in AUDIT_DIR).
+AUDIT_SINK = os.getenv("AUDIT_SINK", "db")
+AUDIT_DIR = os.getenv("AUDIT_DIR", "./audit")
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", "1.0"))
+AUDIT_BACKPRESSURE_MS = int(os.getenv("AUDIT_BACKPRESSURE_MS", "200"))
+
+# Scan display derivatives (thumbnail + preview) kept in a size-bounded disk cache.
+DERIVATIVE_CACHE_DIR = os.getenv("DERIVATIVE_CACHE_DIR", "./scan_cache")
+DERIVATIVE_CACHE_MAX_MB = int(os.getenv("DERIVATIVE_CACHE_MAX_MB", "512"))
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "128"))
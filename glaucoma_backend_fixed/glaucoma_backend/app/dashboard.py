@@ -0,0 +1,198 @@
+# app/dashboard.py
+
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, func, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.models import DashboardCounter, Patient, SupportTicket
+
+# Ticket status isn't stored yet; every ticket is reported as OPEN (see routers/support.py).
+DEFAULT_TICKET_STATUS = "OPEN"
+TICKET_STATUSES = ("OPEN", "IN_PROGRESS", "RESOLVED")
+
+# (label, lower bound inclusive, upper bound exclusive or None)
+AGE_BANDS = (
+    ("0-39", 0, 40),
+    ("40-59", 40, 60),
+    ("60-74", 60, 75),
+    ("75+", 75, None),
+)
+
+INITIALIZED_KEY = "meta:initialized"
+PATIENTS_TOTAL = "patients:total"
+TICKETS_TOTAL = "tickets:total"
+
+# Backends with INSERT ... ON CONFLICT DO UPDATE.
+_UPSERT_DIALECTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+
+def age_band(age: Optional[int]) -> str:
+    for label, low, high in AGE_BANDS:
+        if age is not None and age >= low and (high is None or age < high):
+            return label
+    return "unknown"
+
+
+def _patient_keys(gender: str, age: Optional[int]) -> List[str]:
+    return [PATIENTS_TOTAL, f"patients:gender:{gender}", f"patients:age:{age_band(age)}"]
+
+
+def _bump(db: Session, keys: Iterable[str], delta: int) -> None:
+    """
+    Add `delta` to each counter inside the caller's transaction.
+
+    Each key is one upsert whose increment happens in SQL (value = value +
+    delta), so concurrent requests neither overwrite each other's updates
+    nor collide when both create a new key.
+    """
+    insert = _UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    for key in keys:
+        if insert is not None:
+            stmt = insert(DashboardCounter).values(key=key, value=delta)
+            db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[DashboardCounter.key],
+                    set_={"value": DashboardCounter.value + stmt.excluded.value},
+                )
+            )
+            continue
+        # Other backends: update, and create the row if it doesn't exist yet.
+        updated = (
+            db.query(DashboardCounter)
+            .filter(DashboardCounter.key == key)
+            .update({DashboardCounter.value: DashboardCounter.value + delta}, synchronize_session=False)
+        )
+        if not updated:
+            db.add(DashboardCounter(key=key, value=delta))
+            db.flush()
+
+
+# -------------------- write-side hooks --------------------
+
+def record_patient_created(db: Session, patient: Patient) -> None:
+    _bump(db, _patient_keys(patient.gender, patient.age), 1)
+
+
+def record_patient_updated(
+    db: Session, old_gender: str, old_age: Optional[int], patient: Patient
+) -> None:
+    old_keys = _patient_keys(old_gender, old_age)
+    new_keys = _patient_keys(patient.gender, patient.age)
+    if old_keys != new_keys:
+        _bump(db, [k for k in old_keys if k not in new_keys], -1)
+        _bump(db, [k for k in new_keys if k not in old_keys], 1)
+
+
+def record_ticket_created(db: Session, status: str = DEFAULT_TICKET_STATUS) -> None:
+    _bump(db, [TICKETS_TOTAL, f"tickets:status:{status}"], 1)
+
+
+# -------------------- rebuild & read --------------------
+
+def _lock_counters(db: Session) -> None:
+    """Start the write transaction now, blocking writers that bump counters."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE dashboard_counters IN EXCLUSIVE MODE"))
+        return
+    # A no-op write: pysqlite only sends BEGIN before the first write, and
+    # SQLite takes its write lock here, before the aggregates are read.
+    db.query(DashboardCounter).filter(DashboardCounter.key == INITIALIZED_KEY).update(
+        {DashboardCounter.value: DashboardCounter.value}, synchronize_session=False
+    )
+
+
+def rebuild_counters(db: Session) -> None:
+    """
+    Recompute every counter from the base tables with SQL aggregates.
+
+    Runs once on first read (existing databases, or after counters were
+    cleared); afterwards the write-side hooks keep the counters current.
+    The aggregates, the delete and the re-insert share one write transaction
+    that locks the counters first. A patient or ticket created concurrently
+    is therefore either in the aggregates or bumps the rebuilt counters after
+    the commit, never lost in between. A concurrent rebuild finds the
+    counters initialized and returns.
+    """
+    _lock_counters(db)
+    initialized = (
+        db.query(DashboardCounter.value).filter(DashboardCounter.key == INITIALIZED_KEY).scalar()
+    )
+    if initialized is not None:
+        db.commit()
+        return
+
+    band = case(
+        *[
+            ((Patient.age >= low) & (Patient.age < high), label)
+            if high is not None
+            else (Patient.age >= low, label)
+            for label, low, high in AGE_BANDS
+        ],
+        else_="unknown",
+    )
+    counts: Dict[str, int] = {PATIENTS_TOTAL: 0, TICKETS_TOTAL: 0}
+    counts.update({f"patients:age:{label}": 0 for label, _, _ in AGE_BANDS})
+    counts.update({f"tickets:status:{status}": 0 for status in TICKET_STATUSES})
+
+    for gender, count in db.query(Patient.gender, func.count(Patient.id)).group_by(Patient.gender):
+        counts[f"patients:gender:{gender}"] = count
+        counts[PATIENTS_TOTAL] += count
+    for label, count in db.query(band, func.count(Patient.id)).group_by(band):
+        counts[f"patients:age:{label}"] = count
+
+    tickets = db.query(func.count(SupportTicket.id)).scalar() or 0
+    counts[TICKETS_TOTAL] = tickets
+    counts[f"tickets:status:{DEFAULT_TICKET_STATUS}"] = tickets
+    counts[INITIALIZED_KEY] = 1
+
+    db.query(DashboardCounter).delete(synchronize_session=False)
+    db.add_all(DashboardCounter(key=key, value=value) for key, value in counts.items())
+    db.commit()
+
+
+def get_summary(db: Session, recent_limit: int = 5) -> dict:
+    """
+    Dashboard aggregates from the counters table plus the newest patients.
+
+    Cost depends only on the number of counter keys and `recent_limit`,
+    never on the size of the patients or tickets tables.
+    """
+    counters = dict(db.query(DashboardCounter.key, DashboardCounter.value).all())
+    if INITIALIZED_KEY not in counters:
+        rebuild_counters(db)
+        counters = dict(db.query(DashboardCounter.key, DashboardCounter.value).all())
+
+    def group(prefix: str) -> Dict[str, int]:
+        return {
+            key[len(prefix):]: value
+            for key, value in sorted(counters.items())
+            if key.startswith(prefix) and value
+        }
+
+    recent = (
+        db.query(Patient.id, Patient.full_name, Patient.age, Patient.gender, Patient.mrn)
+        .order_by(Patient.id.desc())
+        .limit(recent_limit)
+        .all()
+    )
+
+    return {
+        "patients": {
+            "total": counters.get(PATIENTS_TOTAL, 0),
+            "by_gender": group("patients:gender:"),
+            "by_age_band": {
+                label: counters.get(f"patients:age:{label}", 0) for label, _, _ in AGE_BANDS
+            },
+        },
+        "tickets": {
+            "total": counters.get(TICKETS_TOTAL, 0),
+            "by_status": {
+                status: counters.get(f"tickets:status:{status}", 0)
+                for status in TICKET_STATUSES
+            },
+        },
+        "recent_patients": [row._asdict() for row in recent],
+    }
@@ -1,14 +1,23 @@
+import logging
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.routers import patients
 from app.predictions import routes_predictions as pred_routes
+from app.predictions import routes_jobs as job_routes
 from app.auth import routes_auth as auth_routes
 from app.routers import support as support_routes
+from app.routers import dashboard as dashboard_routes
+from app.routers import audit as audit_routes
 
+from app.config import MODEL_VERSION, TRAFFIC_CAPTURE_PATH, TRAFFIC_CAPTURE_SAMPLE_RATE
 from app.database import Base, engine
 from app import models
+from app.audit import AuditMiddleware, audit_log
+from app.traffic import TrafficCaptureMiddleware
 
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Glaucoma XAI Backend")
 
@@ -27,16 +36,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(AuditMiddleware, log=audit_log)
+
+# Opt-in: records anonymized request shapes for replay_traffic.py.
+if TRAFFIC_CAPTURE_PATH:
+    app.add_middleware(
+        TrafficCaptureMiddleware,
+        path=TRAFFIC_CAPTURE_PATH,
+        sample_rate=TRAFFIC_CAPTURE_SAMPLE_RATE,
+    )
+
 Base.metadata.create_all(bind=engine)
 
 # ------------ ROUTES REGISTERED HERE ------------
 app.include_router(auth_routes.router)               # /api/auth/...
 app.include_router(pred_routes.router)               # /api/predictions/...
+app.include_router(job_routes.router)                # /api/jobs/...
 app.include_router(patients.router)                  # /api/patients/...
 app.include_router(support_routes.router, prefix="/api")  # /api/support-tickets
+app.include_router(dashboard_routes.router)          # /api/dashboard/summary
+app.include_router(audit_routes.router)              # /api/audit/...
 # ------------------------------------------------
 
 
+@app.on_event("startup")
+def start_background_workers():
+    audit_log.start()
+    job_routes.pool.start()
+    # Load and warm the default model off the request path; predictions get
+    # 503 + Retry-After until it is ready.
+    try:
+        pred_routes.registry.load(MODEL_VERSION, activate=True)
+    except KeyError:
+        logger.exception(
+            "Default model '%s' not found; load a version via /api/predict/models",
+            MODEL_VERSION,
+        )
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    job_routes.pool.stop(timeout=5)
+    audit_log.stop()  # flushes whatever is still buffered
+
+
 @app.get("/ping")
 def ping():
     return {"status": "ok", "msg": "Backend running successfully"}
@@ -1,7 +1,7 @@
 # app/models.py
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Index
 from .database import Base
 
 
@@ -40,3 +40,34 @@ class SupportTicket(Base):
     issue_type = Column(String, nullable=False)
     message = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DashboardCounter(Base):
+    """Incrementally maintained dashboard aggregates, one row per counter key."""
+
+    __tablename__ = "dashboard_counters"
+
+    key = Column(String(100), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+class AuditEvent(Base):
+    """Append-only access audit trail, written in batches by app.audit."""
+
+    __tablename__ = "audit_events"
+
+    id = Column(Integer, primary_key=True)
+    ts = Column(DateTime, nullable=False, default=datetime.utcnow)
+    user = Column(String(255), nullable=True)
+    action = Column(String(50), nullable=False)
+    patient_id = Column(Integer, nullable=True)
+    method = Column(String(10), nullable=False)
+    route = Column(String(255), nullable=False)
+    status = Column(Integer, nullable=False)
+    client = Column(String(64), nullable=True)
+    duration_ms = Column(Float, nullable=True)
+
+    __table_args__ = (
+        Index("ix_audit_events_patient_ts", "patient_id", "ts"),
+        Index("ix_audit_events_user_ts", "user", "ts"),
+    )
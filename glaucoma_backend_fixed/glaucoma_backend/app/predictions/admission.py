@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DISCONNECT_POLL_SECONDS = 0.25
+EWMA_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """The request was shed: the queue is full or it would miss its deadline."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ClientDisconnected(Exception):
+    """The client went away before its prediction finished."""
+
+
+class InferenceCancelled(Exception):
+    """Raised inside a worker thread when its cancel event is set."""
+
+
+def raise_if_cancelled(cancel: Optional[threading.Event]) -> None:
+    if cancel is not None and cancel.is_set():
+        raise InferenceCancelled("Inference cancelled: client disconnected.")
+
+
+class AdmissionController:
+    """
+    Bounded admission in front of CNN inference.
+
+    At most `max_concurrency` predictions run at once and at most
+    `max_queue_depth` wait behind them. A request is shed up front when the
+    queue is full or when the estimated time to finish (queue wait plus its
+    own service time) exceeds its deadline, instead of queueing until the
+    client times out. Service time is an EWMA per unit of `cost` (one image,
+    one slice, ...), so requests of very different sizes are estimated
+    proportionally and one large request doesn't inflate every estimate. Work for clients that disconnect is dropped
+    while queued and cancelled at the next checkpoint once running.
+
+    All bookkeeping happens on the event loop thread, so no locking is needed.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue_depth: int,
+        initial_service_seconds: float = 1.0,
+        cost_unit: str = "request",
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.cost_unit = cost_unit
+        self._service_seconds = initial_service_seconds  # per unit of cost
+        self._queued_cost = 0.0
+        self._running_cost = 0.0
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted_total = 0
+        self.completed_total = 0
+        self.cancelled_total = 0
+        self.shed_total: Dict[str, int] = {"queue_full": 0, "deadline": 0}
+
+    def estimated_wait(self) -> float:
+        """Seconds a request admitted now would wait before it gets a slot."""
+        if self.in_flight + self.waiting < self.max_concurrency:
+            return 0.0
+        ahead = self._running_cost + self._queued_cost
+        return ahead / self.max_concurrency * self._service_seconds
+
+    def _shed(self, reason: str, wait: float) -> Overloaded:
+        self.shed_total[reason] += 1
+        return Overloaded(reason, retry_after=max(1, math.ceil(wait)))
+
+    async def run(
+        self,
+        request: Request,
+        deadline_seconds: float,
+        fn: Callable[..., T],
+        *args,
+        cost: float = 1.0,
+    ) -> T:
+        """
+        Run `fn(*args, cancel=<threading.Event>)` in the threadpool once a slot is free.
+
+        `cost` is the size of the request in `cost_unit`s. Raises `Overloaded`
+        if the request is shed and `ClientDisconnected` if the client leaves
+        before the result is ready.
+        """
+        started = time.monotonic()
+        wait = self.estimated_wait()
+        service = self._service_seconds * cost
+        if self.waiting >= self.max_queue_depth:
+            raise self._shed("queue_full", wait)
+        if wait + service > deadline_seconds:
+            raise self._shed("deadline", wait)
+
+        self.admitted_total += 1
+        self.waiting += 1
+        self._queued_cost += cost
+        try:
+            await self._acquire(request, started + deadline_seconds - service)
+        finally:
+            self.waiting -= 1
+            self._queued_cost -= cost
+
+        self.in_flight += 1
+        self._running_cost += cost
+        service_started = time.monotonic()
+        try:
+            result = await self._run_cancellable(request, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self._running_cost -= cost
+            self._slots.release()
+
+        elapsed = time.monotonic() - service_started
+        self._service_seconds += EWMA_ALPHA * (elapsed / cost - self._service_seconds)
+        self.completed_total += 1
+        return result
+
+    async def _acquire(self, request: Request, latest_start: float) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), DISCONNECT_POLL_SECONDS)
+                return
+            except asyncio.TimeoutError:
+                pass
+            if await request.is_disconnected():
+                self.cancelled_total += 1
+                raise ClientDisconnected()
+            if time.monotonic() > latest_start:
+                raise self._shed("deadline", self.estimated_wait())
+
+    async def _run_cancellable(self, request: Request, fn: Callable[..., T], *args) -> T:
+        cancel = threading.Event()
+        task = asyncio.ensure_future(run_in_threadpool(fn, *args, cancel=cancel))
+        while not task.done():
+            await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if not task.done() and not cancel.is_set() and await request.is_disconnected():
+                # The thread can't be killed; it stops at its next checkpoint,
+                # and we keep the slot until it has actually returned.
+                cancel.set()
+        try:
+            return task.result()
+        except InferenceCancelled as exc:
+            self.cancelled_total += 1
+            raise ClientDisconnected() from exc
+
+    def metrics(self) -> Dict[str, object]:
+        return {
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "max_queue_depth": self.max_queue_depth,
+            "cost_unit": self.cost_unit,
+            "service_time_ms": round(self._service_seconds * 1000, 1),
+            "estimated_wait_ms": round(self.estimated_wait() * 1000, 1),
+            "admitted_total": self.admitted_total,
+            "completed_total": self.completed_total,
+            "cancelled_total": self.cancelled_total,
+            "shed_total": sum(self.shed_total.values()),
+            "shed_by_reason": dict(self.shed_total),
+        }
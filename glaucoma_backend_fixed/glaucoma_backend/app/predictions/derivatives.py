@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional
+
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("thumbnail", "preview")
+SCAN_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# WebP is smaller for the same quality; fall back to JPEG if Pillow lacks it.
+if features.check("webp"):
+    DERIVATIVE_FORMAT, DERIVATIVE_EXT, DERIVATIVE_MEDIA_TYPE = "WEBP", ".webp", "image/webp"
+else:
+    DERIVATIVE_FORMAT, DERIVATIVE_EXT, DERIVATIVE_MEDIA_TYPE = "JPEG", ".jpg", "image/jpeg"
+DERIVATIVE_QUALITY = 80
+
+
+def scan_id_for(image_path: str) -> str:
+    """Content hash of the upload, so the same scan always maps to the same URLs."""
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+class DerivativeCache:
+    """
+    Size-bounded on-disk cache of encoded scan derivatives.
+
+    Files are written atomically (temp file + rename) and evicted least
+    recently used first, by mtime, which `get()` refreshes, once the
+    directory grows past `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = sum(p.stat().st_size for p in self.directory.glob(f"*{DERIVATIVE_EXT}"))
+
+    def path(self, scan_id: str, kind: str) -> Path:
+        return self.directory / f"{scan_id}-{kind}{DERIVATIVE_EXT}"
+
+    def has(self, scan_id: str) -> bool:
+        return all(self.path(scan_id, kind).exists() for kind in KINDS)
+
+    def get(self, scan_id: str, kind: str) -> Optional[Path]:
+        path = self.path(scan_id, kind)
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, scan_id: str, kind: str, data: bytes) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, self.path(scan_id, kind))
+        with self._lock:
+            self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict(keep=scan_id)
+
+    def _evict(self, keep: str) -> None:
+        # Rescan instead of trusting the running total: other workers share the directory.
+        files = sorted(
+            (p.stat().st_mtime, p.stat().st_size, p)
+            for p in self.directory.glob(f"*{DERIVATIVE_EXT}")
+        )
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_bytes * 0.9)  # leave headroom so we don't evict on every put
+        for _, size, path in files:
+            if total <= target:
+                break
+            if path.name.startswith(keep):  # never evict the scan being written
+                continue
+            try:
+                path.unlink()
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._size = total
+
+
+def _encode(image: Image.Image) -> bytes:
+    buf = BytesIO()
+    image.save(buf, format=DERIVATIVE_FORMAT, quality=DERIVATIVE_QUALITY)
+    return buf.getvalue()
+
+
+def store_derivatives(
+    cache: DerivativeCache,
+    scan_id: str,
+    image: Image.Image,
+    preview: Image.Image,
+    thumbnail_size: int,
+) -> Dict[str, str]:
+    """
+    Encode and cache the display derivatives of a scan.
+
+    `image` is the decoded upload and `preview` the 320x320 model input
+    already resized from it, so nothing is decoded a second time. The
+    thumbnail keeps the scan's aspect ratio.
+    """
+    if not cache.has(scan_id):
+        scale = thumbnail_size / max(image.size)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        thumbnail = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+        cache.put(scan_id, "thumbnail", _encode(thumbnail))
+        cache.put(scan_id, "preview", _encode(preview))
+    return {kind: str(cache.path(scan_id, kind)) for kind in KINDS}
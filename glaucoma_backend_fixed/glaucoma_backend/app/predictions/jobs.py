@@ -0,0 +1,386 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Job states.
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL_STATES = {SUCCEEDED, FAILED}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           TEXT PRIMARY KEY,
+    kind         TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    payload      TEXT NOT NULL,
+    result       TEXT,
+    error        TEXT,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker       TEXT,
+    run_after    REAL NOT NULL,
+    lease_until  REAL,
+    created_at   REAL NOT NULL,
+    updated_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_claim ON jobs (status, run_after);
+"""
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying the job cannot help (e.g. a rejected image)."""
+
+
+class JobQueue:
+    """
+    Durable FIFO of prediction jobs in a local SQLite file.
+
+    Uploaded inputs are spooled next to it, so queued work survives restarts
+    without any external broker. Workers claim jobs with a lease, which makes
+    the queue safe to drain from several processes at once. A job whose
+    worker process is gone is requeued when a pool starts (`release_orphans`);
+    otherwise it is picked up again once its lease expires.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        spool_dir: str,
+        max_attempts: int = 3,
+        lease_seconds: float = 900,
+        retry_backoff_seconds: float = 5,
+    ):
+        self.db_path = db_path
+        self.spool_dir = Path(spool_dir)
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            # SQLite connections must not cross a fork (see serve.py); reopen.
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # -------------------- producer side --------------------
+
+    def spool_path(self, job_id: str) -> Path:
+        """Inputs live here, named so that sorting them restores submit order."""
+        return self.spool_dir / job_id
+
+    def new_job_id(self) -> str:
+        job_id = uuid.uuid4().hex
+        self.spool_path(job_id).mkdir(parents=True, exist_ok=True)
+        return job_id
+
+    def submit(self, job_id: str, kind: str, payload: Dict[str, object]) -> None:
+        """Enqueue a job whose inputs were already written to `spool_path(job_id)`."""
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, status, payload, max_attempts, run_after,"
+            " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, QUEUED, json.dumps(payload), self.max_attempts, now, now, now),
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, object]]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "max_attempts": row["max_attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+        }
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        counts = {state: 0 for state in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    # -------------------- consumer side --------------------
+
+    def claim(self, worker: str) -> Optional[sqlite3.Row]:
+        """
+        Atomically take the oldest runnable job: queued and due, or running with
+        an expired lease. Jobs that already used up their attempts are failed.
+        """
+        conn = self._conn()
+        while True:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs"
+                    " WHERE (status = ? AND run_after <= ?) OR (status = ? AND lease_until < ?)"
+                    " ORDER BY created_at LIMIT 1",
+                    (QUEUED, now, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+
+                if row["attempts"] >= row["max_attempts"]:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?, lease_until = NULL,"
+                        " updated_at = ? WHERE id = ?",
+                        (FAILED, row["error"] or "Worker lost while running the job.", now, row["id"]),
+                    )
+                    conn.execute("COMMIT")
+                    self._cleanup(row["id"])
+                    continue
+
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?,"
+                    " lease_until = ?, updated_at = ? WHERE id = ?",
+                    (RUNNING, worker, now + self.lease_seconds, now, row["id"]),
+                )
+                conn.execute("COMMIT")
+                return row
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def complete(self, job_id: str, result: Dict[str, object]) -> None:
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = NULL, lease_until = NULL,"
+            " updated_at = ? WHERE id = ?",
+            (SUCCEEDED, json.dumps(result), time.time(), job_id),
+        )
+        self._cleanup(job_id)
+
+    def fail(self, job_id: str, error: str, retry: bool = True) -> None:
+        """Record a failed attempt; requeue with exponential backoff if attempts remain."""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        now = time.time()
+        if retry and row is not None and row["attempts"] < row["max_attempts"]:
+            delay = self.retry_backoff_seconds * 2 ** (row["attempts"] - 1)
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, run_after = ?, lease_until = NULL,"
+                " updated_at = ? WHERE id = ?",
+                (QUEUED, error, now + delay, now, job_id),
+            )
+            return
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated_at = ?"
+            " WHERE id = ?",
+            (FAILED, error, now, job_id),
+        )
+        self._cleanup(job_id)
+
+    def release_orphans(self) -> int:
+        """
+        Requeue running jobs whose worker process no longer exists.
+
+        Meant to be called before this process starts its own workers, so any
+        job still leased to this pid is left over from an earlier run (a
+        restarted container typically gets the same pid back). Jobs owned by
+        live processes, e.g. sibling workers under serve.py, are left alone.
+        Attempts are not reset, so a job that keeps killing its worker still
+        ends up failed.
+        """
+        conn = self._conn()
+        now = time.time()
+        released = 0
+        rows = conn.execute(
+            "SELECT id, worker FROM jobs WHERE status = ?", (RUNNING,)
+        ).fetchall()
+        for row in rows:
+            pid = _worker_pid(row["worker"])
+            if pid is None or (pid != os.getpid() and _pid_alive(pid)):
+                continue
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL, run_after = ?,"
+                " error = COALESCE(error, ?), updated_at = ?"
+                " WHERE id = ? AND status = ? AND worker = ?",
+                (QUEUED, now, f"Worker {row['worker']} exited while running the job.",
+                 now, row["id"], RUNNING, row["worker"]),
+            )
+            released += cursor.rowcount
+        if released:
+            logger.info("Requeued %d job(s) left running by exited workers", released)
+        return released
+
+    def purge(self, older_than_seconds: float) -> int:
+        """Delete finished jobs last updated more than `older_than_seconds` ago."""
+        cursor = self._conn().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (SUCCEEDED, FAILED, time.time() - older_than_seconds),
+        )
+        return cursor.rowcount
+
+    def _cleanup(self, job_id: str) -> None:
+        shutil.rmtree(self.spool_path(job_id), ignore_errors=True)
+
+
+def _worker_pid(worker: Optional[str]) -> Optional[int]:
+    try:
+        return int((worker or "").split(":", 1)[0])
+    except ValueError:
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill would terminate the process here; rely on the lease instead.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+JobHandler = Callable[[Dict[str, object], List[str]], Dict[str, object]]
+
+
+class JobWorkerPool:
+    """
+    Fixed number of threads draining a `JobQueue`.
+
+    The thread count is the concurrency bound: at most `workers` jobs run in
+    this process at a time, whatever the queue depth.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, JobHandler],
+        workers: int = 1,
+        poll_interval: float = 1.0,
+        retention_seconds: float = 7 * 24 * 3600,
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._last_purge = 0.0
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        try:
+            self.queue.release_orphans()
+        except sqlite3.Error:
+            logger.exception("Requeueing jobs of exited workers failed")
+        for idx in range(self.workers):
+            thread = threading.Thread(
+                target=self._run, name=f"job-worker-{idx}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Started %d prediction job worker(s)", self.workers)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop claiming new jobs; running jobs finish or are re-leased after restart."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        worker = f"{os.getpid()}:{threading.current_thread().name}"
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(worker)
+            except sqlite3.Error:
+                logger.exception("Claiming a job failed")
+                job = None
+
+            if job is None:
+                self._maybe_purge()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+
+            try:
+                self._execute(job)
+            except Exception:
+                # Typically "database is locked" while recording the outcome. The
+                # job stays leased and is retried later; keep this worker alive.
+                logger.exception("Recording the outcome of job %s failed", job["id"])
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _execute(self, job: sqlite3.Row) -> None:
+        job_id = job["id"]
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            self.queue.fail(job_id, f"Unknown job kind '{job['kind']}'.", retry=False)
+            return
+
+        spool = self.queue.spool_path(job_id)
+        inputs = sorted(str(p) for p in spool.iterdir()) if spool.is_dir() else []
+        started = time.perf_counter()
+        try:
+            result = handler(json.loads(job["payload"]), inputs)
+        except PermanentJobError as exc:
+            self.queue.fail(job_id, str(exc), retry=False)
+        except Exception as exc:
+            logger.exception("Job %s (%s) failed", job_id, job["kind"])
+            self.queue.fail(job_id, str(exc))
+        else:
+            self.queue.complete(job_id, result)
+            logger.info(
+                "Job %s (%s) finished in %.1fs",
+                job_id,
+                job["kind"],
+                time.perf_counter() - started,
+            )
+
+    def _maybe_purge(self) -> None:
+        now = time.time()
+        if now - self._last_purge < 3600:
+            return
+        self._last_purge = now
+        try:
+            self.queue.purge(self.retention_seconds)
+        except sqlite3.Error:
+            logger.exception("Purging finished jobs failed")
+
@@ -2,18 +2,36 @@ from __future__ import annotations
 
 import logging
 import os
-from functools import lru_cache
+import threading
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
 
 import numpy as np
-from PIL import Image, ImageFile
+from PIL import Image, ImageFile, ImageSequence
 
-ImageFile.LOAD_TRUNCATED_IMAGES = True  # helps with slightly corrupted OCT exports
+from app.config import (
+    ALLOW_TRUNCATED_IMAGES,
+    DERIVATIVE_CACHE_DIR,
+    DERIVATIVE_CACHE_MAX_MB,
+    MODEL_DIR,
+    MODEL_MEMORY_BUDGET_MB,
+    MODEL_VERSION,
+    THUMBNAIL_SIZE,
+    VOLUME_BATCH_SIZE,
+    VOLUME_MAX_SLICES,
+)
+
+from .runtime import apply_precision, apply_xla, configure_runtime, plan_settings
+
+# Off by default so the quality gate can reject truncated uploads.
+ImageFile.LOAD_TRUNCATED_IMAGES = ALLOW_TRUNCATED_IMAGES
 
 # The model was exported with standalone Keras 3, so we ensure the same loader here.
 os.environ.setdefault("KERAS_BACKEND", "tensorflow")
+# Thread pools / oneDNN / XLA have to be set before TensorFlow runs anything.
+_runtime_settings = plan_settings()
 try:
+    configure_runtime(_runtime_settings)
     import keras  # type: ignore
 except Exception as exc:  # pragma: no cover - surfaces missing dependency early
     raise RuntimeError(
@@ -22,65 +40,83 @@ except Exception as exc:  # pragma: no cover - surfaces missing dependency early
     ) from exc
 
 
+from .admission import raise_if_cancelled
+from .derivatives import DerivativeCache, scan_id_for, store_derivatives
+from .quality import (
+    ImageRejected,
+    check_dimensions,
+    check_header,
+    decode_errors,
+    load_checked_image,
+)
+from .registry import ModelRegistry
+
 CLASS_NAMES: List[str] = ["normal", "early", "advanced"]
 TARGET_SIZE = (320, 320)
-MODEL_FILENAME = "glaucoma_best_model_ft2.keras"
 
 logger = logging.getLogger(__name__)
 
 
-def _model_path() -> Path:
+def _model_search_dirs() -> List[Path]:
     """
-    Resolve the path to the glaucoma model.
-
-    Expected location for your setup:
-    <project_root>/Models/glaucoma_best_model_ft2.keras
-    i.e. C:\\Users\\Jeevan bn\\Glaucoma_diagnosis\\Models\\glaucoma_best_model_ft2.keras
+    Directories scanned for model versions, in priority order: MODEL_DIR (if set),
+    then <project_root>/Models, then the legacy location next to glaucoma_backend.
     """
-    # project_root = .../Glaucoma_diagnosis
-    project_root = Path(__file__).resolve().parents[4]
-
-    # First choice: Models/ folder at project root
-    candidate = project_root / "Models" / MODEL_FILENAME
-    if candidate.exists():
-        return candidate
+    dirs = [Path(__file__).resolve().parents[4] / "Models", Path(__file__).resolve().parents[2]]
+    if MODEL_DIR:
+        dirs.insert(0, Path(MODEL_DIR))
+    return dirs
 
-    # Fallback: old location (same folder as glaucoma_backend)
-    base_dir = Path(__file__).resolve().parents[2]
-    legacy_candidate = base_dir / MODEL_FILENAME
-    if legacy_candidate.exists():
-        return legacy_candidate
 
-    raise FileNotFoundError(
-        f"Model file '{MODEL_FILENAME}' was not found.\n"
-        f"Tried:\n - {candidate}\n - {legacy_candidate}\n"
-        "Make sure the .keras file is present in a valid location."
-    )
+registry = ModelRegistry(
+    search_dirs=_model_search_dirs(),
+    default_version=MODEL_VERSION,
+    input_shape=(*TARGET_SIZE, 3),
+    loader=lambda path: apply_xla(apply_precision(keras.models.load_model(path))),
+    memory_budget_bytes=MODEL_MEMORY_BUDGET_MB * 1024 * 1024,
+)
 
 
+derivative_cache = DerivativeCache(DERIVATIVE_CACHE_DIR, DERIVATIVE_CACHE_MAX_MB * 1024 * 1024)
 
-@lru_cache(maxsize=1)
-def _load_model():
-    logger.info("Loading glaucoma staging model from disk...")
-    return keras.models.load_model(str(_model_path()))
 
+def _to_tensor(image: Image.Image) -> np.ndarray:
+    return _resized_to_tensor(image.resize(TARGET_SIZE))
 
-def _prepare_image(image_path: str) -> np.ndarray:
-    with Image.open(image_path) as img:
-        image = img.convert("RGB").resize(TARGET_SIZE)
 
-    array = np.asarray(image, dtype=np.float32)
+def _resized_to_tensor(resized: Image.Image) -> np.ndarray:
+    array = np.asarray(resized, dtype=np.float32)
     array /= 255.0
     return np.expand_dims(array, axis=0)
 
 
-def predict_glaucoma(image_path: str) -> Dict[str, Dict[str, float] | str | None]:
+class PreparedScan:
+    """A scan that passed the quality gate, decoded and resized for the model."""
+
+    def __init__(self, path: str, image: Image.Image):
+        self.path = path
+        self.image = image
+        self.resized = image.resize(TARGET_SIZE)
+        self.tensor = _resized_to_tensor(self.resized)
+
+
+def prepare_scan(image_path: str) -> PreparedScan:
+    """Run the quality gate and preprocessing; raises `ImageRejected` for unusable uploads."""
+    return PreparedScan(image_path, load_checked_image(image_path))
+
+
+def classify_scan(
+    scan: PreparedScan,
+    cancel: Optional[threading.Event] = None,
+) -> Dict[str, Dict[str, float] | str | None]:
     """
-    Run the OCT scan through the CNN and return the predicted stage.
+    Run a prepared scan through the CNN and return the predicted stage.
+
+    Raises `InferenceCancelled` if `cancel` is set before the model runs.
     """
-    model = _load_model()
-    input_tensor = _prepare_image(image_path)
-    prediction = model.predict(input_tensor, verbose=0)[0]
+    raise_if_cancelled(cancel)
+    with registry.acquire() as (model_version, model):
+        prediction = model.predict(scan.tensor, verbose=0)[0]
 
     probabilities = {
         label: float(prediction[idx]) for idx, label in enumerate(CLASS_NAMES)
@@ -91,4 +127,144 @@ def predict_glaucoma(image_path: str) -> Dict[str, Dict[str, float] | str | None
         "prediction": predicted_stage,
         "probabilities": probabilities,
         "explainability": None,  # Placeholder for Grad-CAM / saliency maps
+        "model_version": model_version,
+    }
+
+
+def store_scan_derivatives(scan: PreparedScan) -> Optional[str]:
+    """Cache thumbnail + preview for the scan; a failure here never fails the prediction."""
+    try:
+        scan_id = scan_id_for(scan.path)
+        store_derivatives(derivative_cache, scan_id, scan.image, scan.resized, THUMBNAIL_SIZE)
+        return scan_id
+    except Exception:
+        logger.exception("Creating scan derivatives failed")
+        return None
+
+
+def predict_glaucoma(
+    image_path: str,
+    cancel: Optional[threading.Event] = None,
+) -> Dict[str, Dict[str, float] | str | None]:
+    """
+    Quality-check, classify and cache one OCT scan.
+
+    The API route runs these steps separately so that only `classify_scan`
+    holds an admission slot; this is the all-in-one version for job workers.
+    The thumbnail and preview are cached under the returned `scan_id`.
+    """
+    scan = prepare_scan(image_path)
+    result = classify_scan(scan, cancel=cancel)
+    result["scan_id"] = store_scan_derivatives(scan)
+    return result
+
+
+# -------------------- OCT VOLUMES --------------------
+
+VOLUME_FORMATS = ("TIFF", "PNG", "JPEG")
+
+
+def inspect_volume(image_paths: Sequence[str]) -> int:
+    """
+    Return the slice count of a volume from its file headers, without decoding
+    pixels, so it can be validated and costed before inference. Raises
+    `ImageRejected` for bad headers, empty volumes or too many slices.
+    """
+    count = 0
+    for image_path in image_paths:
+        check_header(image_path, allowed_formats=VOLUME_FORMATS)
+        with decode_errors(), Image.open(image_path) as img:
+            check_dimensions(*img.size)
+            count += getattr(img, "n_frames", 1)
+    if count == 0:
+        raise ImageRejected("empty_volume", "The volume contains no slices.")
+    if count > VOLUME_MAX_SLICES:
+        raise ImageRejected("too_many_slices", f"Volume has more than {VOLUME_MAX_SLICES} slices.")
+    return count
+
+
+def _iter_volume_frames(image_paths: Sequence[str]) -> Iterator[Image.Image]:
+    """
+    Lazily yield every B-scan of a volume as an RGB image.
+
+    A volume is either one multi-page TIFF or an ordered stack of single
+    images (or both); frames are decoded one at a time as they are consumed.
+    """
+    count = 0
+    for image_path in image_paths:
+        check_header(image_path, allowed_formats=VOLUME_FORMATS)
+        with decode_errors(), Image.open(image_path) as img:
+            for frame in ImageSequence.Iterator(img):
+                count += 1
+                if count > VOLUME_MAX_SLICES:
+                    raise ImageRejected(
+                        "too_many_slices",
+                        f"Volume has more than {VOLUME_MAX_SLICES} slices.",
+                    )
+                check_dimensions(*frame.size)
+                yield frame.convert("RGB")
+
+
+def _iter_batches(frames: Iterable[Image.Image], batch_size: int) -> Iterator[np.ndarray]:
+    batch: List[np.ndarray] = []
+    for frame in frames:
+        batch.append(_to_tensor(frame)[0])
+        if len(batch) == batch_size:
+            yield np.stack(batch)
+            batch = []
+    if batch:
+        yield np.stack(batch)
+
+
+def predict_volume(
+    image_paths: Sequence[str],
+    include_slices: bool = False,
+    batch_size: Optional[int] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Dict[str, object]:
+    """
+    Stage a whole OCT volume.
+
+    Slices are preprocessed and run through the CNN in fixed-size batches, so
+    at most `batch_size` slices are held in memory regardless of volume size.
+    The volume-level stage is the argmax of the mean per-slice probabilities.
+    Raises `ImageRejected` if the volume is empty, unreadable or too large;
+    `cancel` is checked between batches.
+    """
+    batch_size = batch_size or VOLUME_BATCH_SIZE
+    totals = np.zeros(len(CLASS_NAMES), dtype=np.float64)
+    slices: List[Dict[str, object]] = []
+    slice_count = 0
+
+    with registry.acquire() as (model_version, model):
+        for batch in _iter_batches(_iter_volume_frames(image_paths), batch_size):
+            raise_if_cancelled(cancel)
+            predictions = model.predict(batch, verbose=0)
+            totals += predictions.sum(axis=0)
+            if include_slices:
+                for prediction in predictions:
+                    slices.append(
+                        {
+                            "index": slice_count,
+                            "prediction": CLASS_NAMES[int(np.argmax(prediction))],
+                            "probabilities": {
+                                label: float(prediction[idx])
+                                for idx, label in enumerate(CLASS_NAMES)
+                            },
+                        }
+                    )
+                    slice_count += 1
+            else:
+                slice_count += len(predictions)
+
+    if slice_count == 0:
+        raise ImageRejected("empty_volume", "The volume contains no slices.")
+
+    mean = totals / slice_count
+    return {
+        "prediction": CLASS_NAMES[int(np.argmax(mean))],
+        "probabilities": {label: float(mean[idx]) for idx, label in enumerate(CLASS_NAMES)},
+        "slice_count": slice_count,
+        "model_version": model_version,
+        "slices": slices if include_slices else None,
     }
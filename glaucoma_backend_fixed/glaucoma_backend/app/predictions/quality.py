@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of the formats we know how to decode.
+MAGIC_BYTES: Dict[bytes, str] = {
+    b"\x89PNG\r\n\x1a\n": "PNG",
+    b"\xff\xd8\xff": "JPEG",
+    b"II*\x00": "TIFF",
+    b"MM\x00*": "TIFF",
+}
+DEFAULT_FORMATS = ("PNG", "JPEG")
+
+# Geometry limits, checked from the header before any pixel is decoded.
+MIN_SIDE = 64
+MAX_SIDE = 8192
+MAX_ASPECT_RATIO = 8.0
+
+# Content heuristics, evaluated on a ~128px grayscale copy.
+HEURISTIC_SIDE = 128
+BLANK_LEVEL = 8            # gray value treated as "black"
+SATURATED_LEVEL = 247      # gray value treated as "white"
+MAX_BLANK_FRACTION = 0.98
+MAX_SATURATED_FRACTION = 0.90
+MIN_CONTRAST_SPREAD = 10.0  # p99 - p1 of gray levels
+MAX_MEAN_CHROMA = 40.0      # OCT B-scans are (near) grayscale; colour photos are not
+
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+class ImageRejected(Exception):
+    """
+    Raised when an upload fails the pre-inference quality gate.
+
+    `reason` is a stable machine-readable code, `message` is for humans.
+    """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+
+    def as_detail(self) -> Dict[str, str]:
+        return {"reason": self.reason, "message": self.message}
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    for magic, fmt in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return fmt
+    return None
+
+
+def check_header(image_path: str, allowed_formats: Iterable[str] = DEFAULT_FORMATS) -> str:
+    """Reject files whose magic bytes aren't an accepted image format."""
+    with open(image_path, "rb") as fh:
+        head = fh.read(16)
+    if not head:
+        raise ImageRejected("empty_file", "The uploaded file is empty.")
+
+    fmt = sniff_format(head)
+    if fmt is None or fmt not in allowed_formats:
+        raise ImageRejected(
+            "unsupported_format",
+            f"File content is not a {' / '.join(allowed_formats)} image.",
+        )
+    return fmt
+
+
+def check_dimensions(width: int, height: int) -> None:
+    if min(width, height) < MIN_SIDE:
+        raise ImageRejected(
+            "too_small",
+            f"Image is {width}x{height}; at least {MIN_SIDE}px per side is required.",
+        )
+    if max(width, height) > MAX_SIDE:
+        raise ImageRejected(
+            "too_large",
+            f"Image is {width}x{height}; at most {MAX_SIDE}px per side is accepted.",
+        )
+    if max(width, height) / min(width, height) > MAX_ASPECT_RATIO:
+        raise ImageRejected(
+            "bad_aspect_ratio",
+            f"Image is {width}x{height}, which does not look like an OCT scan.",
+        )
+
+
+def check_content(image: Image.Image) -> None:
+    """
+    Cheap NumPy heuristics for blank, saturated, flat or colour (non-OCT) frames.
+    """
+    factor = max(1, min(image.size) // HEURISTIC_SIDE)
+    small = image.reduce(factor) if factor > 1 else image
+    pixels = np.asarray(small, dtype=np.float32)
+    gray = pixels @ _LUMA
+
+    if np.mean(gray < BLANK_LEVEL) > MAX_BLANK_FRACTION:
+        raise ImageRejected("blank", "Image is blank (almost entirely black).")
+    if np.mean(gray > SATURATED_LEVEL) > MAX_SATURATED_FRACTION:
+        raise ImageRejected("saturated", "Image is saturated (almost entirely white).")
+
+    low, high = np.percentile(gray, (1, 99))
+    if high - low < MIN_CONTRAST_SPREAD:
+        raise ImageRejected("low_contrast", "Image has too little contrast to grade.")
+
+    chroma = float(np.mean(pixels.max(axis=2) - pixels.min(axis=2)))
+    if chroma > MAX_MEAN_CHROMA:
+        raise ImageRejected(
+            "wrong_modality",
+            "Image is strongly coloured; expected a grayscale OCT B-scan.",
+        )
+
+
+@contextmanager
+def decode_errors() -> Iterator[None]:
+    """Translate Pillow decode failures into `ImageRejected`."""
+    try:
+        yield
+    except ImageRejected:
+        raise
+    except Image.DecompressionBombError as exc:
+        raise ImageRejected("too_large", str(exc)) from exc
+    except (OSError, SyntaxError, ValueError) as exc:
+        reason = "truncated" if "truncated" in str(exc) else "decode_failed"
+        raise ImageRejected(reason, f"Image could not be decoded: {exc}") from exc
+
+
+def load_checked_image(image_path: str) -> Image.Image:
+    """
+    Run the quality gate and return the decoded RGB image for inference.
+
+    Checks run cheapest first (magic bytes, header geometry, strict decode,
+    content heuristics) so bad uploads are rejected in a few milliseconds and
+    never reach `model.predict`. The decoded image is returned so the caller
+    doesn't decode the file a second time.
+    """
+    started = time.perf_counter()
+    check_header(image_path)
+
+    with decode_errors(), Image.open(image_path) as img:
+        check_dimensions(*img.size)
+        img.load()
+        image = img.convert("RGB")
+
+    check_content(image)
+    logger.debug("Quality gate passed in %.1f ms", (time.perf_counter() - started) * 1000)
+    return image
@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import gc
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_SUFFIX = ".keras"
+
+# Version lifecycle states.
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+UNLOADED = "unloaded"
+
+
+class ModelVersion:
+    """
+    One model file known to the registry, loaded or not.
+    """
+
+    def __init__(self, name: str, path: Path):
+        self.name = name
+        self.path = path
+        self.model = None
+        self.state = UNLOADED
+        self.error: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+        self.last_used: float = 0.0
+        self.in_flight = 0
+        self.size_bytes = 0
+        self.ready = threading.Event()
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "version": self.name,
+            "path": str(self.path),
+            "state": self.state,
+            "error": self.error,
+            "loaded_at": self.loaded_at,
+            "last_used": self.last_used or None,
+            "in_flight": self.in_flight,
+            "size_mb": round(self.size_bytes / (1024 * 1024), 1),
+        }
+
+
+class ModelRegistry:
+    """
+    Keeps several model versions in memory and routes predictions to the active one.
+
+    New versions are loaded and warmed on a background thread and only then made
+    active, so traffic never waits on a cold load. The previously active version
+    stays loaded for instant rollback, and idle versions are unloaded (least
+    recently used first) whenever the loaded set exceeds `memory_budget_bytes`.
+    """
+
+    def __init__(
+        self,
+        search_dirs: Sequence[Path],
+        default_version: str,
+        input_shape: Tuple[int, ...],
+        loader: Callable[[str], object],
+        memory_budget_bytes: int,
+    ):
+        self.search_dirs = [Path(d) for d in search_dirs]
+        self.default_version = default_version
+        self.input_shape = input_shape
+        self.memory_budget_bytes = memory_budget_bytes
+        self._loader = loader
+        self._lock = threading.RLock()
+        self._versions: Dict[str, ModelVersion] = {}
+        self._active: Optional[str] = None
+        self._previous: Optional[str] = None
+
+    # -------------------- discovery --------------------
+
+    def discover(self) -> List[str]:
+        """Scan the search dirs for `*.keras` files; the first dir wins on name clashes."""
+        with self._lock:
+            for directory in self.search_dirs:
+                if not directory.is_dir():
+                    continue
+                for path in sorted(directory.glob(f"*{MODEL_SUFFIX}")):
+                    if path.stem not in self._versions:
+                        self._versions[path.stem] = ModelVersion(path.stem, path)
+            return sorted(self._versions)
+
+    def _get(self, version: str) -> ModelVersion:
+        with self._lock:
+            if version not in self._versions:
+                self.discover()
+            entry = self._versions.get(version)
+        if entry is None:
+            tried = "\n".join(f" - {d / (version + MODEL_SUFFIX)}" for d in self.search_dirs)
+            raise KeyError(
+                f"Model version '{version}' was not found.\nTried:\n{tried}\n"
+                "Make sure the .keras file is present in a valid location."
+            )
+        return entry
+
+    # -------------------- loading --------------------
+
+    def load(
+        self,
+        version: str,
+        activate: bool = False,
+        background: bool = True,
+        warm: bool = True,
+    ) -> ModelVersion:
+        """
+        Load and warm `version`; optionally switch traffic to it once it is ready.
+
+        With `background=True` this returns immediately and the caller can poll
+        `status()`; otherwise it blocks until the version is ready or failed.
+        `warm=False` skips the warm-up prediction (see `warmup()`).
+        """
+        entry = self._get(version)
+        with self._lock:
+            start = entry.state in (UNLOADED, FAILED)
+            if start:
+                entry.state = LOADING
+                entry.error = None
+                entry.ready.clear()
+
+        if start:
+            if background:
+                threading.Thread(
+                    target=self._load_entry,
+                    args=(entry, activate, warm),
+                    name=f"model-load-{version}",
+                    daemon=True,
+                ).start()
+                return entry
+            self._load_entry(entry, activate, warm)
+        elif not background:
+            entry.ready.wait()
+
+        if activate and not start:
+            if background:
+                threading.Thread(
+                    target=self._activate_when_ready, args=(entry,), daemon=True
+                ).start()
+            elif entry.state == READY:
+                self._switch_to(entry)
+        if not background and entry.state == FAILED:
+            raise RuntimeError(f"Model version '{version}' failed to load: {entry.error}")
+        return entry
+
+    def _load_entry(self, entry: ModelVersion, activate: bool, warm: bool = True) -> None:
+        started = time.perf_counter()
+        try:
+            logger.info("Loading glaucoma staging model '%s' from disk...", entry.name)
+            model = self._loader(str(entry.path))
+
+            if warm:
+                with self._lock:
+                    entry.state = WARMING
+                self._warm(model)
+
+            with self._lock:
+                entry.model = model
+                entry.size_bytes = _model_size_bytes(model, entry.path)
+                entry.loaded_at = time.time()
+                entry.state = READY
+            logger.info(
+                "Model '%s' ready in %.1fs (%.1f MB)",
+                entry.name,
+                time.perf_counter() - started,
+                entry.size_bytes / (1024 * 1024),
+            )
+        except Exception as exc:
+            logger.exception("Loading model '%s' failed", entry.name)
+            with self._lock:
+                entry.model = None
+                entry.state = FAILED
+                entry.error = str(exc)
+        finally:
+            entry.ready.set()
+
+        if activate and entry.state == READY:
+            self._switch_to(entry)
+        else:
+            self._enforce_budget()
+
+    def _warm(self, model) -> None:
+        # One throwaway prediction builds the inference function up front.
+        model.predict(np.zeros((1, *self.input_shape), dtype=np.float32), verbose=0)
+
+    def warmup(self) -> None:
+        """Run the warm-up prediction on the active version (e.g. in a forked worker)."""
+        entry = self.ensure_active()
+        self._warm(entry.model)
+
+    def _activate_when_ready(self, entry: ModelVersion) -> None:
+        entry.ready.wait()
+        if entry.state == READY:
+            self._switch_to(entry)
+
+    def _switch_to(self, entry: ModelVersion) -> None:
+        """
+        Activate a freshly loaded version.
+
+        If nothing has served yet, the default version is brought up first so
+        it becomes the rollback target rather than leaving `previous` empty.
+        """
+        with self._lock:
+            cold = self._active is None
+        if cold and entry.name != self.default_version:
+            try:
+                self.ensure_active()
+            except Exception:
+                logger.warning(
+                    "Default model '%s' could not be loaded; activating '%s' "
+                    "without a rollback target",
+                    self.default_version,
+                    entry.name,
+                    exc_info=True,
+                )
+        self.activate(entry.name)
+
+    # -------------------- switching --------------------
+
+    def activate(self, version: str) -> None:
+        """Atomically route new predictions to `version`, which must already be loaded."""
+        entry = self._get(version)
+        with self._lock:
+            if entry.state != READY:
+                raise RuntimeError(
+                    f"Model version '{version}' is {entry.state}; load it before activating."
+                )
+            if self._active != version:
+                self._previous = self._active
+                self._active = version
+                logger.info("Active model switched %s -> %s", self._previous, version)
+        self._enforce_budget()
+
+    def rollback(self) -> str:
+        """Switch back to the previously active version."""
+        with self._lock:
+            previous = self._previous
+        if previous is None:
+            raise RuntimeError("There is no previous model version to roll back to.")
+        self.activate(previous)
+        return previous
+
+    def unload(self, version: str) -> None:
+        entry = self._get(version)
+        with self._lock:
+            if version == self._active:
+                raise RuntimeError("The active model version cannot be unloaded.")
+            if entry.in_flight:
+                raise RuntimeError(f"Model version '{version}' is still serving requests.")
+            self._drop(entry)
+
+    def _drop(self, entry: ModelVersion) -> None:
+        entry.model = None
+        entry.state = UNLOADED
+        entry.size_bytes = 0
+        entry.ready.clear()
+        if self._previous == entry.name:
+            self._previous = None
+        logger.info("Unloaded model '%s'", entry.name)
+
+    def _enforce_budget(self) -> None:
+        with self._lock:
+            loaded = [v for v in self._versions.values() if v.state == READY]
+            total = sum(v.size_bytes for v in loaded)
+            if total <= self.memory_budget_bytes:
+                return
+            # Oldest idle versions go first; the rollback target goes last.
+            candidates = sorted(
+                (v for v in loaded if v.name != self._active and v.in_flight == 0),
+                key=lambda v: (v.name == self._previous, v.last_used),
+            )
+            for entry in candidates:
+                if total <= self.memory_budget_bytes:
+                    break
+                total -= entry.size_bytes
+                self._drop(entry)
+        gc.collect()
+
+    # -------------------- serving --------------------
+
+    def ensure_active(self, warm: bool = True) -> ModelVersion:
+        """Lazily load the default version on first use, like the old single-model cache."""
+        with self._lock:
+            active = self._active
+        if active is None:
+            entry = self.load(self.default_version, background=False, warm=warm)
+            with self._lock:
+                if self._active is None:
+                    self.activate(entry.name)
+                active = self._active
+        return self._versions[active]
+
+    def is_serving(self) -> bool:
+        """True once a version is active, i.e. `acquire()` won't block on a cold load."""
+        with self._lock:
+            return self._active is not None
+
+    @contextmanager
+    def acquire(self) -> Iterator[Tuple[str, object]]:
+        """
+        Yield `(version, model)` for the active version.
+
+        The version is pinned for the duration of the block, so a concurrent
+        switch or budget eviction never pulls the model out from under a request.
+        """
+        self.ensure_active()
+        with self._lock:
+            entry = self._versions[self._active]
+            entry.in_flight += 1
+            entry.last_used = time.time()
+            model = entry.model
+        try:
+            yield entry.name, model
+        finally:
+            with self._lock:
+                entry.in_flight -= 1
+
+    def status(self) -> Dict[str, object]:
+        self.discover()
+        with self._lock:
+            return {
+                "active": self._active,
+                "previous": self._previous,
+                "memory_budget_mb": round(self.memory_budget_bytes / (1024 * 1024), 1),
+                "loaded_mb": round(
+                    sum(v.size_bytes for v in self._versions.values()) / (1024 * 1024), 1
+                ),
+                "versions": [self._versions[name].as_dict() for name in sorted(self._versions)],
+            }
+
+
+def _model_size_bytes(model, path: Path) -> int:
+    """Estimate resident weight memory; fall back to the file size."""
+    try:
+        return int(
+            sum(int(np.prod(w.shape)) * np.dtype(w.dtype).itemsize for w in model.weights)
+        )
+    except Exception:
+        return path.stat().st_size
@@ -0,0 +1,158 @@
+import asyncio
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi import (
+    APIRouter,
+    File,
+    Form,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+
+from app.audit import audit_patient
+from app.config import (
+    JOB_DB_PATH,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_SPOOL_DIR,
+    JOB_WORKERS,
+)
+from .jobs import TERMINAL_STATES, JobQueue, JobWorkerPool, PermanentJobError
+from .model import predict_glaucoma, predict_volume
+from .quality import ImageRejected
+from .routes_predictions import ACCEPTED_CONTENT_TYPES, VOLUME_CONTENT_TYPES, with_scan_urls
+
+router = APIRouter(prefix="/api/jobs", tags=["Prediction Jobs"])
+
+MAX_WAIT_SECONDS = 60
+POLL_INTERVAL_SECONDS = 0.25
+
+
+# -------------------- JOB HANDLERS --------------------
+
+def _run_batch(payload: Dict[str, object], inputs: List[str]) -> Dict[str, object]:
+    """One prediction per image; a rejected image doesn't fail the whole batch."""
+    results = []
+    for filename, path in zip(payload["filenames"], inputs):
+        try:
+            results.append({"filename": filename, **with_scan_urls(predict_glaucoma(path))})
+        except ImageRejected as exc:
+            results.append({"filename": filename, "error": exc.as_detail()})
+    return {"results": results}
+
+
+def _run_volume(payload: Dict[str, object], inputs: List[str]) -> Dict[str, object]:
+    try:
+        return predict_volume(inputs, include_slices=bool(payload.get("include_slices")))
+    except ImageRejected as exc:
+        raise PermanentJobError(f"{exc.reason}: {exc.message}") from exc
+
+
+queue = JobQueue(
+    db_path=JOB_DB_PATH,
+    spool_dir=JOB_SPOOL_DIR,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    lease_seconds=JOB_LEASE_SECONDS,
+)
+pool = JobWorkerPool(
+    queue,
+    handlers={"predict": _run_batch, "volume": _run_volume},
+    workers=JOB_WORKERS,
+)
+
+
+def _enqueue(kind: str, files: List[UploadFile], allowed_types, payload: Dict[str, object]):
+    for upload in files:
+        if upload.content_type not in allowed_types:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"Unsupported image type '{upload.content_type}'.",
+            )
+
+    job_id = queue.new_job_id()
+    spool = queue.spool_path(job_id)
+    try:
+        for idx, upload in enumerate(files):
+            suffix = Path(upload.filename or "").suffix or ".png"
+            with open(spool / f"{idx:05d}{suffix}", "wb") as out:
+                shutil.copyfileobj(upload.file, out)
+        payload["filenames"] = [upload.filename for upload in files]
+        queue.submit(job_id, kind, payload)
+    except Exception:
+        shutil.rmtree(spool, ignore_errors=True)
+        raise
+    finally:
+        for upload in files:
+            upload.file.close()
+
+    pool.wake()
+    return {"job_id": job_id, "status": "queued", "status_url": f"{router.prefix}/{job_id}"}
+
+
+# -------------------- SUBMIT --------------------
+
+@router.post(
+    "/predict",
+    summary="Queue OCT predictions for one or more images",
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def submit_prediction_job(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    patient_id: Optional[str] = Form(default=None),
+):
+    audit_patient(request, patient_id)
+    return _enqueue("predict", files, ACCEPTED_CONTENT_TYPES, {"patient_id": patient_id})
+
+
+@router.post(
+    "/volume",
+    summary="Queue glaucoma staging for an OCT volume",
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def submit_volume_job(
+    request: Request,
+    files: List[UploadFile] = File(..., description="Multi-page TIFF or ordered B-scans"),
+    include_slices: bool = Form(default=False),
+    patient_id: Optional[str] = Form(default=None),
+):
+    audit_patient(request, patient_id)
+    return _enqueue(
+        "volume",
+        files,
+        VOLUME_CONTENT_TYPES,
+        {"patient_id": patient_id, "include_slices": include_slices},
+    )
+
+
+# -------------------- STATUS --------------------
+
+@router.get("/stats", summary="Job counts by status")
+def job_stats():
+    return {"workers": pool.workers, "jobs": queue.stats()}
+
+
+@router.get("/{job_id}", summary="Job status and result (optionally long-polling)")
+async def get_job(
+    job_id: str,
+    wait: float = Query(default=0, ge=0, le=MAX_WAIT_SECONDS, description="Seconds to wait for completion"),
+):
+    """
+    Returns the job immediately, or with `wait > 0` holds the request until
+    the job finishes or `wait` seconds pass, whichever comes first.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        job = await run_in_threadpool(queue.get, job_id)
+        if job is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+        if job["status"] in TERMINAL_STATES or time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
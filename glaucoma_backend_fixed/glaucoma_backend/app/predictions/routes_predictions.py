@@ -1,24 +1,103 @@
 import os
 import shutil
 import tempfile
+from functools import partial
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 from fastapi import (
     APIRouter,
     File,
     Form,
     HTTPException,
+    Request,
     UploadFile,
     status,
 )
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response
 
-from app.schemas import PredictionResponse
-from .model import predict_glaucoma
+from app.audit import audit_patient
+from app.config import (
+    PREDICT_DEADLINE_SECONDS,
+    PREDICT_MAX_CONCURRENCY,
+    PREDICT_MAX_QUEUE_DEPTH,
+    VOLUME_DEADLINE_SECONDS,
+    VOLUME_MAX_CONCURRENCY,
+    VOLUME_MAX_QUEUE_DEPTH,
+    VOLUME_SYNC_MAX_SLICES,
+)
+from app.procstats import memory_usage
+from app.schemas import PredictionResponse, VolumePredictionResponse
+from .admission import AdmissionController, ClientDisconnected, Overloaded
+from .derivatives import DERIVATIVE_MEDIA_TYPE, KINDS, SCAN_ID_PATTERN
+from .model import (
+    classify_scan,
+    derivative_cache,
+    inspect_volume,
+    predict_volume,
+    prepare_scan,
+    registry,
+    store_scan_derivatives,
+)
+from .quality import ImageRejected
+from .runtime import active_settings
 
 router = APIRouter(prefix="/api/predict", tags=["Predictions"])
 
 ACCEPTED_CONTENT_TYPES = {"image/png", "image/jpeg", "image/jpg"}
+VOLUME_CONTENT_TYPES = ACCEPTED_CONTENT_TYPES | {"image/tiff", "image/tif"}
+
+# Clients may ask for a shorter deadline than the server default, never a longer one.
+DEADLINE_HEADER = "X-Request-Deadline"
+CLIENT_CLOSED_REQUEST = 499
+# Seconds clients are told to wait while the model loads after a restart.
+MODEL_LOADING_RETRY_AFTER = 5
+
+# Derivatives are content-addressed, so a URL never changes meaning. They are
+# still patient images: cache in the browser only, never in shared proxies.
+SCAN_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+admission = AdmissionController(
+    max_concurrency=PREDICT_MAX_CONCURRENCY,
+    max_queue_depth=PREDICT_MAX_QUEUE_DEPTH,
+    cost_unit="image",
+)
+# Separate slots and a per-slice service estimate, so volumes never hold the
+# single-image slot or skew its estimate.
+volume_admission = AdmissionController(
+    max_concurrency=VOLUME_MAX_CONCURRENCY,
+    max_queue_depth=VOLUME_MAX_QUEUE_DEPTH,
+    initial_service_seconds=0.25,
+    cost_unit="slice",
+)
+
+
+def with_scan_urls(prediction: dict) -> dict:
+    scan_id = prediction.get("scan_id")
+    if scan_id:
+        prediction["thumbnail_url"] = f"{router.prefix}/scans/{scan_id}/thumbnail"
+        prediction["preview_url"] = f"{router.prefix}/scans/{scan_id}/preview"
+    return prediction
+
+
+def _require_model() -> None:
+    """Answer 503 while no model version is ready rather than cold-loading inside a request."""
+    if not registry.is_serving():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The prediction model is still loading; retry shortly.",
+            headers={"Retry-After": str(MODEL_LOADING_RETRY_AFTER)},
+        )
+
+
+def _request_deadline(request: Request, limit: float) -> float:
+    raw = request.headers.get(DEADLINE_HEADER)
+    try:
+        requested = float(raw) if raw else limit
+    except ValueError:
+        requested = limit
+    return max(0.0, min(requested, limit))
 
 
 @router.post(
@@ -27,6 +106,7 @@ ACCEPTED_CONTENT_TYPES = {"image/png", "image/jpeg", "image/jpg"}
     response_model=PredictionResponse,
 )
 async def predict_image(
+    request: Request,
     image: Optional[UploadFile] = File(default=None),
     file: Optional[UploadFile] = File(default=None, description="Backward compatible"),
     patient_id: Optional[str] = Form(default=None),
@@ -34,8 +114,14 @@ async def predict_image(
     """
     Accepts an OCT scan upload, runs it through the ML model, and returns the
     predicted glaucoma stage plus per-class probabilities.
+
+    Requests that can't finish within their deadline (server default, or
+    shorter via the `X-Request-Deadline` header in seconds) are shed with
+    503 + Retry-After instead of queueing, as are requests that arrive while
+    the model is still loading after a restart.
     """
 
+    audit_patient(request, patient_id)
     upload = image or file
     if upload is None:
         raise HTTPException(
@@ -49,6 +135,7 @@ async def predict_image(
             detail="Only PNG and JPEG images are supported.",
         )
 
+    _require_model()
     temp_path = None
     suffix = Path(upload.filename or "").suffix or ".png"
 
@@ -57,11 +144,37 @@ async def predict_image(
             shutil.copyfileobj(upload.file, temp_file)
             temp_path = temp_file.name
 
-        prediction = predict_glaucoma(temp_path)
-        # TODO: Use patient_id for auditing / storage once prediction history is implemented.
-        return prediction
+        # The quality gate runs before admission, so a bad upload gets its 422
+        # without queueing, and caching the derivatives happens after the slot
+        # is released, so it doesn't count as inference time.
+        scan = await run_in_threadpool(prepare_scan, temp_path)
+        prediction = await admission.run(
+            request,
+            _request_deadline(request, PREDICT_DEADLINE_SECONDS),
+            classify_scan,
+            scan,
+        )
+        prediction["scan_id"] = await run_in_threadpool(store_scan_derivatives, scan)
+        return with_scan_urls(prediction)
     except HTTPException:
         raise
+    except Overloaded as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Prediction service is overloaded ({exc.reason}); retry later.",
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+    except ClientDisconnected as exc:
+        # Nobody is listening any more; the status only shows up in access logs.
+        raise HTTPException(
+            status_code=CLIENT_CLOSED_REQUEST,
+            detail="Client disconnected; prediction cancelled.",
+        ) from exc
+    except ImageRejected as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=exc.as_detail(),
+        ) from exc
     except Exception as exc:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -71,3 +184,176 @@ async def predict_image(
         upload.file.close()
         if temp_path and os.path.exists(temp_path):
             os.remove(temp_path)
+
+
+@router.post(
+    "/volume",
+    summary="Run glaucoma staging on a multi-frame OCT volume",
+    response_model=VolumePredictionResponse,
+)
+async def predict_oct_volume(
+    request: Request,
+    files: List[UploadFile] = File(..., description="Multi-page TIFF or ordered B-scans"),
+    include_slices: bool = Form(default=False),
+    patient_id: Optional[str] = Form(default=None),
+):
+    """
+    Accepts one multi-page TIFF and/or a stack of B-scan images (in slice
+    order) and returns a volume-level stage. Set `include_slices` to also get
+    the per-slice predictions. Volumes have their own admission queue,
+    costed per slice, and can be shed with 503 + Retry-After. Volumes over
+    VOLUME_SYNC_MAX_SLICES are refused with 413; submit those to
+    `POST /api/jobs/volume` instead.
+    """
+    audit_patient(request, patient_id)
+    for upload in files:
+        if upload.content_type not in VOLUME_CONTENT_TYPES:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Only TIFF, PNG and JPEG images are supported.",
+            )
+
+    _require_model()
+    temp_paths: List[str] = []
+    try:
+        for upload in files:
+            suffix = Path(upload.filename or "").suffix or ".tif"
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+                shutil.copyfileobj(upload.file, temp_file)
+                temp_paths.append(temp_file.name)
+
+        slice_count = await run_in_threadpool(inspect_volume, temp_paths)
+        if slice_count > VOLUME_SYNC_MAX_SLICES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=(
+                    f"Volume has {slice_count} slices; volumes over {VOLUME_SYNC_MAX_SLICES} "
+                    "slices must be submitted to POST /api/jobs/volume."
+                ),
+            )
+        return await volume_admission.run(
+            request,
+            _request_deadline(request, VOLUME_DEADLINE_SECONDS),
+            partial(predict_volume, include_slices=include_slices),
+            temp_paths,
+            cost=slice_count,
+        )
+    except HTTPException:
+        raise
+    except Overloaded as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Prediction service is overloaded ({exc.reason}); retry later.",
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+    except ClientDisconnected as exc:
+        raise HTTPException(
+            status_code=CLIENT_CLOSED_REQUEST,
+            detail="Client disconnected; volume prediction cancelled.",
+        ) from exc
+    except ImageRejected as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=exc.as_detail(),
+        ) from exc
+    except Exception as exc:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Volume prediction failed: {exc}",
+        ) from exc
+    finally:
+        for upload in files:
+            upload.file.close()
+        for temp_path in temp_paths:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+@router.get("/scans/{scan_id}/{kind}", summary="Cached thumbnail or preview of a scan")
+def get_scan_derivative(scan_id: str, kind: str, request: Request):
+    if kind not in KINDS or not SCAN_ID_PATTERN.match(scan_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Scan image not found")
+
+    etag = f'"{scan_id}-{kind}"'
+    headers = {"Cache-Control": SCAN_CACHE_CONTROL, "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    path = derivative_cache.get(scan_id, kind)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Scan image not found")
+    return FileResponse(path, media_type=DERIVATIVE_MEDIA_TYPE, headers=headers)
+
+
+@router.get("/metrics", summary="Admission control queue and shedding metrics")
+def prediction_metrics():
+    return {**admission.metrics(), "volumes": volume_admission.metrics()}
+
+
+@router.get("/runtime", summary="TensorFlow threading and execution settings in use")
+def inference_runtime():
+    return active_settings
+
+
+@router.get("/memory", summary="Unique vs shared memory of this worker process")
+def worker_memory():
+    try:
+        return memory_usage()
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(exc)) from exc
+
+
+# -------------------- MODEL REGISTRY --------------------
+
+@router.get("/models", summary="List model versions and which one is serving")
+def list_models():
+    return registry.status()
+
+
+@router.post(
+    "/models/{version}/load",
+    summary="Load and warm a model version in the background",
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def load_model_version(version: str, activate: bool = False):
+    """
+    Starts loading `version` without blocking traffic. With `activate=true`
+    predictions switch to it as soon as it has been warmed up; if no version
+    has served yet, the default one is loaded first so rollback has a target.
+    """
+    try:
+        entry = registry.load(version, activate=activate)
+    except KeyError as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=exc.args[0]) from exc
+    return entry.as_dict()
+
+
+@router.post("/models/{version}/activate", summary="Switch traffic to a loaded model version")
+def activate_model_version(version: str):
+    try:
+        registry.activate(version)
+    except KeyError as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=exc.args[0]) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
+    return registry.status()
+
+
+@router.post("/models/rollback", summary="Switch back to the previous model version")
+def rollback_model_version():
+    try:
+        registry.rollback()
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
+    return registry.status()
+
+
+@router.delete("/models/{version}", summary="Unload an idle model version")
+def unload_model_version(version: str):
+    try:
+        registry.unload(version)
+    except KeyError as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=exc.args[0]) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
+    return registry.status()
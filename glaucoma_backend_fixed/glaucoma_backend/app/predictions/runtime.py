@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import logging
+import math
+import os
+from typing import Dict, Optional
+
+from app.config import (
+    INFERENCE_INTER_OP_THREADS,
+    INFERENCE_INTRA_OP_THREADS,
+    INFERENCE_ONEDNN,
+    INFERENCE_PRECISION,
+    INFERENCE_XLA,
+    WEB_CONCURRENCY,
+)
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = ("float32", "mixed_bfloat16", "mixed_float16")
+
+# Filled in by configure_runtime(); reported by /api/predict/runtime.
+active_settings: Dict[str, object] = {}
+
+
+def detect_cpus() -> int:
+    """
+    CPUs this process may actually use: the affinity mask, further capped by a
+    cgroup CPU quota when running in a container.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS / Windows
+        cpus = os.cpu_count() or 1
+
+    quota = _cgroup_cpu_limit()
+    if quota:
+        cpus = min(cpus, max(1, math.floor(quota)))
+    return cpus
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    try:  # cgroup v2
+        with open("/sys/fs/cgroup/cpu.max") as fh:
+            quota, period = fh.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:  # cgroup v1
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as fh:
+            quota = int(fh.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as fh:
+            period = int(fh.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def plan_settings(
+    cpus: Optional[int] = None,
+    workers: Optional[int] = None,
+    intra_op: Optional[int] = None,
+    inter_op: Optional[int] = None,
+    onednn: Optional[str] = None,
+    xla: Optional[bool] = None,
+    precision: Optional[str] = None,
+) -> Dict[str, object]:
+    """
+    Work out thread pools and execution options for one worker process.
+
+    Each of the `workers` processes on the node gets an equal share of the
+    CPUs for its intra-op pool, so together they don't oversubscribe the
+    cores. The inter-op pool stays small: a single-image CNN forward pass has
+    little op-level parallelism to exploit. Explicit arguments (or their
+    INFERENCE_* settings) override the derived values.
+    """
+    cpus = cpus or detect_cpus()
+    workers = max(1, workers or WEB_CONCURRENCY)
+    share = max(1, cpus // workers)
+
+    intra_op = intra_op or INFERENCE_INTRA_OP_THREADS or share
+    inter_op = inter_op or INFERENCE_INTER_OP_THREADS or (1 if share <= 4 else 2)
+
+    onednn = (onednn or INFERENCE_ONEDNN).lower()
+    if onednn == "auto":
+        # oneDNN pays off with a few threads to parallelise over; with 1-2 it
+        # mostly adds layout-conversion overhead.
+        onednn = "on" if intra_op >= 4 else "off"
+
+    precision = precision or INFERENCE_PRECISION
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown inference precision '{precision}'; expected one of {PRECISIONS}.")
+
+    return {
+        "cpus": cpus,
+        "workers": workers,
+        "intra_op_threads": intra_op,
+        "inter_op_threads": inter_op,
+        "onednn": onednn == "on",
+        "xla": INFERENCE_XLA if xla is None else xla,
+        "precision": precision,
+    }
+
+
+def configure_runtime(settings: Optional[Dict[str, object]] = None) -> Dict[str, object]:
+    """
+    Apply `settings` (default: `plan_settings()`) to this process.
+
+    Must run before TensorFlow executes its first op: the oneDNN switch is
+    read from the environment at import time and the thread pools can't be
+    resized once created. `app.predictions.model` calls this before it
+    imports Keras.
+    """
+    settings = settings or plan_settings()
+
+    os.environ["TF_ENABLE_ONEDNN_OPTS"] = "1" if settings["onednn"] else "0"
+    # OpenMP (used by oneDNN) sizes its own pool; keep it in line with TF's.
+    os.environ.setdefault("OMP_NUM_THREADS", str(settings["intra_op_threads"]))
+
+    import tensorflow as tf
+
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(settings["intra_op_threads"])
+        tf.config.threading.set_inter_op_parallelism_threads(settings["inter_op_threads"])
+    except RuntimeError:
+        # TensorFlow was already initialised (e.g. configure_runtime called twice).
+        logger.warning("TensorFlow already initialised; thread pool sizes unchanged.")
+    # Auto-clustering only; on CPU it needs TF_XLA_FLAGS to do anything. The
+    # model's own jit_compile (see apply_xla) is what XLA-compiles predict().
+    tf.config.optimizer.set_jit(bool(settings["xla"]))
+
+    active_settings.clear()
+    active_settings.update(settings)
+    logger.info("Inference runtime: %s", settings)
+    return settings
+
+
+def apply_xla(model, xla: Optional[bool] = None):
+    """
+    Set whether `model.predict` is XLA-compiled, per the `xla` setting.
+
+    Keras builds the predict function with `model.jit_compile`, which it
+    resolves to False on CPU-only hosts, so without this INFERENCE_XLA would
+    have no effect there. Must be applied before the first prediction.
+    """
+    model.jit_compile = bool(active_settings.get("xla", False) if xla is None else xla)
+    return model
+
+
+def apply_precision(model, precision: Optional[str] = None):
+    """
+    Return `model` rebuilt with a mixed-precision dtype policy.
+
+    A saved .keras model pins every layer's dtype in its config, so a global
+    policy set before loading has no effect. Instead we clone the layers with
+    the requested policy and copy the float32 weights across.
+    """
+    precision = precision or active_settings.get("precision", "float32")
+    if precision == "float32":
+        return model
+
+    import keras
+
+    def clone_layer(layer):
+        config = layer.get_config()
+        if "dtype" in config:
+            config["dtype"] = precision
+        return layer.__class__.from_config(config)
+
+    clone = keras.models.clone_model(model, clone_function=clone_layer)
+    clone.set_weights(model.get_weights())
+    return clone
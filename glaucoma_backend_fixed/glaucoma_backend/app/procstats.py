@@ -0,0 +1,44 @@
+# app/procstats.py
+
+import os
+from typing import Dict, Optional
+
+# smaps fields (kB) we report, grouped into unique vs shared memory.
+_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def _read_smaps(pid: int) -> Dict[str, int]:
+    totals = {field: 0 for field in _FIELDS}
+    # smaps_rollup is the pre-summed version (Linux 4.14+); smaps works everywhere.
+    for name in ("smaps_rollup", "smaps"):
+        path = f"/proc/{pid}/{name}"
+        if not os.path.exists(path):
+            continue
+        with open(path) as fh:
+            for line in fh:
+                key, _, rest = line.partition(":")
+                if key in totals:
+                    totals[key] += int(rest.split()[0])
+        return totals
+    raise FileNotFoundError(f"No smaps information for pid {pid} (Linux only).")
+
+
+def memory_usage(pid: Optional[int] = None) -> Dict[str, float]:
+    """
+    Per-process memory split, in MB.
+
+    - unique_mb: pages only this process maps (USS); what a worker really costs.
+    - shared_mb: pages mapped by other processes too, e.g. model weights
+      inherited copy-on-write from a pre-fork parent.
+    - pss_mb: the process's fair share, shared pages divided among their users.
+    """
+    pid = pid or os.getpid()
+    kb = _read_smaps(pid)
+    mb = lambda value: round(value / 1024, 1)  # noqa: E731
+    return {
+        "pid": pid,
+        "rss_mb": mb(kb["Rss"]),
+        "pss_mb": mb(kb["Pss"]),
+        "unique_mb": mb(kb["Private_Clean"] + kb["Private_Dirty"]),
+        "shared_mb": mb(kb["Shared_Clean"] + kb["Shared_Dirty"]),
+    }
@@ -0,0 +1,39 @@
+# app/routers/audit.py
+
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+
+from app.audit import audit_log
+from app.serialization import FastJSONResponse
+
+router = APIRouter(prefix="/api/audit", tags=["audit"])
+
+
+@router.get(
+    "/events",
+    summary="Audit trail for a patient and/or a user, newest first",
+    response_class=FastJSONResponse,
+)
+async def list_audit_events(
+    patient_id: Optional[int] = Query(default=None),
+    user: Optional[str] = Query(default=None, description="User email (token subject)"),
+    since: Optional[datetime] = Query(default=None),
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    if patient_id is None and user is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Filter by patient_id and/or user.",
+        )
+    events = await run_in_threadpool(
+        audit_log.sink.query, patient_id=patient_id, user=user, since=since, limit=limit
+    )
+    return FastJSONResponse(events)
+
+
+@router.get("/stats", summary="Audit buffer and flush statistics")
+def audit_stats():
+    return audit_log.stats()
@@ -0,0 +1,22 @@
+# app/routers/dashboard.py
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.dashboard import get_summary
+from app.database import get_db
+from app.serialization import FastJSONResponse
+
+router = APIRouter(prefix="/api", tags=["dashboard"])
+
+
+@router.get(
+    "/dashboard/summary",
+    summary="Patient and ticket aggregates for the doctor dashboard",
+    response_class=FastJSONResponse,
+)
+def dashboard_summary(
+    recent: int = Query(default=5, ge=0, le=50),
+    db: Session = Depends(get_db),
+):
+    return FastJSONResponse(get_summary(db, recent_limit=recent))
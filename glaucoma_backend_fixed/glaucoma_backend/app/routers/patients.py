@@ -1,12 +1,14 @@
 # app/routers/patients.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from typing import List
 from sqlalchemy.orm import Session
 
+from app.audit import audit_patient
 from app.database import get_db
-from app import schemas
+from app import dashboard, schemas
 from app.models import Patient
+from app.serialization import FastJSONResponse, rows_to_dicts
 
 # 👇 NEW IMPORTS FOR PDF
 from io import BytesIO
@@ -17,6 +19,17 @@ from datetime import datetime
 
 router = APIRouter(prefix="/api", tags=["patients"])
 
+# Column order mirrors schemas.PatientOut so the fast list path emits the same JSON.
+PATIENT_LIST_FIELDS = (
+    "full_name",
+    "age",
+    "gender",
+    "medical_history",
+    "risk_factors",
+    "mrn",
+    "id",
+)
+
 
 # -------------------- CREATE PATIENT --------------------
 @router.post(
@@ -26,6 +39,7 @@ router = APIRouter(prefix="/api", tags=["patients"])
 )
 def create_patient(
     patient: schemas.PatientCreate,
+    request: Request,
     db: Session = Depends(get_db),
 ):
     db_patient = Patient(
@@ -37,8 +51,10 @@ def create_patient(
         mrn=patient.mrn,
     )
     db.add(db_patient)
+    dashboard.record_patient_created(db, db_patient)
     db.commit()
     db.refresh(db_patient)
+    audit_patient(request, db_patient.id)
     return db_patient
 
 
@@ -46,11 +62,14 @@ def create_patient(
 @router.get(
     "/patients",
     response_model=List[schemas.PatientOut],
+    response_class=FastJSONResponse,
     status_code=status.HTTP_200_OK,
 )
 def list_patients(db: Session = Depends(get_db)):
-    patients = db.query(Patient).order_by(Patient.id).all()
-    return patients
+    # Read-only path: select plain columns and skip per-row orm_mode validation.
+    columns = [getattr(Patient, field) for field in PATIENT_LIST_FIELDS]
+    rows = db.query(*columns).order_by(Patient.id).all()
+    return FastJSONResponse(rows_to_dicts(rows, PATIENT_LIST_FIELDS))
 
 
 # -------------------- GET SINGLE PATIENT --------------------
@@ -87,12 +106,15 @@ def update_patient(
             detail="Patient not found",
         )
 
+    old_gender, old_age = patient.gender, patient.age
+
     patient.full_name = updated.full_name
     patient.age = updated.age
     patient.gender = updated.gender
     patient.medical_history = updated.medical_history
     patient.risk_factors = updated.risk_factors
     patient.mrn = updated.mrn
+    dashboard.record_patient_updated(db, old_gender, old_age, patient)
 
     db.commit()
     db.refresh(patient)
@@ -5,8 +5,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
+from app.dashboard import record_ticket_created
 from app.database import get_db
 from app.models import SupportTicket
+from app.serialization import FastJSONResponse
 
 # All routes here will be under /api/support-tickets
 router = APIRouter(
@@ -37,6 +39,7 @@ def create_ticket(payload: SupportTicketCreate, db: Session = Depends(get_db)):
             created_at=datetime.utcnow(),
         )
         db.add(new_ticket)
+        record_ticket_created(db)
         db.commit()
         db.refresh(new_ticket)
 
@@ -50,24 +53,37 @@ def create_ticket(payload: SupportTicketCreate, db: Session = Depends(get_db)):
 
 # ---------- Get all tickets (used by SupportTickets.tsx) ----------
 
-@router.get("", response_model=List[dict])
-def get_tickets(db: Session = Depends(get_db)) -> List[dict]:
-    tickets = db.query(SupportTicket).order_by(SupportTicket.id.desc()).all()
-
-    return [
-        {
-            "id": t.id,
-            "subject": f"[{t.issue_type}] {t.name}",
-            "description": t.message,
-            "status": "OPEN",          # default for now
-            "patient_name": t.name,
-            "doctor_name": None,
-            "priority": "MEDIUM",
-            "created_at": t.created_at,
-            "updated_at": t.created_at,
-        }
-        for t in tickets
-    ]
+@router.get("", response_model=List[dict], response_class=FastJSONResponse)
+def get_tickets(db: Session = Depends(get_db)):
+    # Only the columns we render; no ORM objects, orjson handles the datetimes.
+    tickets = (
+        db.query(
+            SupportTicket.id,
+            SupportTicket.name,
+            SupportTicket.issue_type,
+            SupportTicket.message,
+            SupportTicket.created_at,
+        )
+        .order_by(SupportTicket.id.desc())
+        .all()
+    )
+
+    return FastJSONResponse(
+        [
+            {
+                "id": t.id,
+                "subject": f"[{t.issue_type}] {t.name}",
+                "description": t.message,
+                "status": "OPEN",          # default for now
+                "patient_name": t.name,
+                "doctor_name": None,
+                "priority": "MEDIUM",
+                "created_at": t.created_at,
+                "updated_at": t.created_at,
+            }
+            for t in tickets
+        ]
+    )
 
 
 # ---------- Admin/developer can update status via docs ----------
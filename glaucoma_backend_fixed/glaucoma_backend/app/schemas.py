@@ -1,6 +1,6 @@
 ﻿# app/schemas.py
 from pydantic import BaseModel, EmailStr, validator
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 
 # -------------------------------------------
@@ -58,6 +58,24 @@ class PredictionResponse(BaseModel):
     prediction: str
     probabilities: Dict[str, float]
     explainability: Optional[Dict] = None
+    model_version: Optional[str] = None
+    scan_id: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
+
+
+class SlicePrediction(BaseModel):
+    index: int
+    prediction: str
+    probabilities: Dict[str, float]
+
+
+class VolumePredictionResponse(BaseModel):
+    prediction: str
+    probabilities: Dict[str, float]
+    slice_count: int
+    model_version: Optional[str] = None
+    slices: Optional[List[SlicePrediction]] = None
 
 
 # -------------------------------------------
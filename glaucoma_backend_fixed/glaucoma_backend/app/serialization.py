@@ -0,0 +1,24 @@
+# app/serialization.py
+
+from typing import Any, Iterable, List, Sequence
+
+from fastapi.responses import ORJSONResponse
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    orjson-backed response for read-only list endpoints.
+
+    orjson serializes datetimes, None and plain dicts natively, so handlers can
+    hand it raw rows without going through `jsonable_encoder` first.
+    """
+
+
+def rows_to_dicts(rows: Iterable[Sequence[Any]], fields: Sequence[str]) -> List[dict]:
+    """
+    Turn column tuples from `db.query(<columns>)` into dicts keyed by `fields`.
+
+    This skips building ORM objects and per-row Pydantic validation, so only use
+    it where the selected columns already match the response schema.
+    """
+    return [dict(zip(fields, row)) for row in rows]
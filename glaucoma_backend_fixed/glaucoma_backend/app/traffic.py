@@ -0,0 +1,230 @@
+# app/traffic.py
+
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from io import BytesIO
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Only the first bytes of a request body are inspected (headers of multipart
+# parts and image headers live there); the rest is counted, not kept.
+SNIFF_BYTES = 64 * 1024
+
+_IMAGE_MAGIC = (b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff", b"II*\x00", b"MM\x00*")
+_SAFE_VALUE = re.compile(r"^(?:-?\d+(?:\.\d+)?|true|false)$", re.IGNORECASE)
+# Fields naming a record (patient_id, id, mrn, ...) are identifiers even when numeric.
+_ID_NAME = re.compile(r"(?:^|_)(?:id|mrn)$", re.IGNORECASE)
+# Ages are bucketed (HIPAA Safe Harbor treats ages over 89 as identifying);
+# birth dates/years are reduced to their length like free text.
+_AGE_NAME = re.compile(r"(?:^|_)age$", re.IGNORECASE)
+_BIRTH_NAME = re.compile(r"(?:^|_)(?:dob|birth_?(?:date|year)|date_of_birth)$", re.IGNORECASE)
+
+# Recorded instead of the path for requests that matched no route.
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def route_template(scope: dict) -> str:
+    """
+    The matched route pattern (e.g. /api/patients/{patient_id}) rather than
+    the concrete path, so ids never end up in a trace or audit record. The
+    path of a request that matched no route is arbitrary client input, so it
+    is never recorded; such requests all map to UNMATCHED_ROUTE.
+    """
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    if "endpoint" not in scope:
+        return UNMATCHED_ROUTE
+    path = scope.get("path", "")
+    for name, value in (scope.get("path_params") or {}).items():
+        path = path.replace(str(value), "{" + name + "}", 1)
+    return path
+
+
+def scrub(name: str, value: str):
+    """
+    Keep numbers and booleans (deadlines, flags, limits) and reduce anything
+    else to its length. Id fields are reduced to their type, like path
+    params, and ages to a ten-year bucket ("90+" above 89).
+    """
+    if _ID_NAME.search(name):
+        return {"id": "int" if value.isdigit() else "str"}
+    if _AGE_NAME.search(name):
+        return {"age": _age_bucket(value)}
+    if _BIRTH_NAME.search(name):
+        return {"len": len(value)}
+    return value if _SAFE_VALUE.match(value) else {"len": len(value)}
+
+
+def _age_bucket(value: str) -> Optional[str]:
+    try:
+        age = int(float(value))
+    except ValueError:
+        return None
+    if age >= 90:
+        return "90+"
+    low = max(0, age) // 10 * 10
+    return f"{low}-{low + 9}"
+
+
+def _image_shape(data: bytes) -> Optional[Dict[str, object]]:
+    try:
+        with Image.open(BytesIO(data)) as img:  # header only, no pixel decode
+            return {"format": img.format, "width": img.size[0], "height": img.size[1]}
+    except Exception:
+        return None
+
+
+def _json_shape(body: bytes):
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(payload, dict):
+        return {"type": type(payload).__name__}
+    shape = {}
+    for key, value in payload.items():
+        if value is None:
+            shape[key] = {"type": "null"}
+        elif isinstance(value, str):
+            shape[key] = {"type": "str", "len": len(value)}
+        else:
+            shape[key] = {"type": type(value).__name__}
+    return shape
+
+
+def iter_multipart(head: bytes, content_type: str) -> Iterator[Tuple[str, bytes, bytes]]:
+    """
+    Yield `(field name, part headers, part body)` for the multipart parts
+    contained in `head` (the last one may be cut off).
+    """
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not match:
+        return
+    for raw in head.split(b"--" + match.group(1).encode())[1:]:
+        headers, _, body = raw.partition(b"\r\n\r\n")
+        name = re.search(rb'name="([^"]*)"', headers)
+        if name is not None:
+            yield name.group(1).decode(errors="replace"), headers, body
+
+
+def _multipart_shape(head: bytes, content_type: str) -> List[Dict[str, object]]:
+    parts = []
+    for name, headers, body in iter_multipart(head, content_type):
+        part: Dict[str, object] = {"name": name}
+        if b"filename=" in headers:
+            # Filenames often carry patient names/MRNs; only the image shape is kept.
+            ctype = re.search(rb"Content-Type:\s*([^\r\n]+)", headers, re.IGNORECASE)
+            part["content_type"] = ctype.group(1).decode().strip() if ctype else None
+            if body.startswith(_IMAGE_MAGIC):
+                part["image"] = _image_shape(body)
+        else:
+            part["value"] = scrub(name, body.rstrip(b"\r\n").decode(errors="replace"))
+        parts.append(part)
+    return parts
+
+
+class TrafficRecorder:
+    """Appends request records as JSON lines from a background thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.started = time.time()
+        self._queue: "queue.SimpleQueue[dict]" = queue.SimpleQueue()
+        threading.Thread(target=self._write, name="traffic-capture", daemon=True).start()
+
+    def record(self, event: dict) -> None:
+        self._queue.put(event)
+
+    def _write(self) -> None:
+        with open(self.path, "a", buffering=1) as fh:
+            while True:
+                fh.write(json.dumps(self._queue.get(), separators=(",", ":")) + "\n")
+
+
+class TrafficCaptureMiddleware:
+    """
+    ASGI middleware that records anonymized request shapes and timings.
+
+    Each record holds the route template, status, latency, request and
+    response sizes, query/form values reduced to numbers, booleans or
+    lengths (ids to their type, ages to a bucket), JSON body keys with value
+    types and lengths, and the format and dimensions of uploaded images.
+    Unmatched paths are not recorded. No ids, names, MRNs, exact ages, free
+    text, filenames or pixels are stored. Bodies pass through unchanged; only the first
+    SNIFF_BYTES are looked at.
+    """
+
+    def __init__(self, app, path: str, sample_rate: float = 1.0):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.recorder = TrafficRecorder(path)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        offset = time.time() - self.recorder.started
+        head = bytearray()
+        sizes = {"request": 0, "response": 0}
+        status = {"code": 500}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                sizes["request"] += len(body)
+                if len(head) < SNIFF_BYTES:
+                    head.extend(body[: SNIFF_BYTES - len(head)])
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                sizes["response"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            try:
+                self.recorder.record(
+                    self._event(scope, bytes(head), offset, started, sizes, status["code"])
+                )
+            except Exception:
+                logger.exception("Traffic capture failed for one request")
+
+    def _event(self, scope, head: bytes, offset: float, started: float, sizes, code: int) -> dict:
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        content_type = headers.get("content-type", "")
+        event = {
+            "t": round(offset, 4),
+            "method": scope["method"],
+            "route": route_template(scope),
+            "path_params": sorted((scope.get("path_params") or {}).keys()),
+            "query": {
+                k: scrub(k, v) for k, v in parse_qsl(scope.get("query_string", b"").decode("latin-1"))
+            },
+            "status": code,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            "request_bytes": sizes["request"],
+            "response_bytes": sizes["response"],
+            "content_type": content_type.split(";")[0].strip() or None,
+        }
+        if content_type.startswith("application/json") and sizes["request"] <= SNIFF_BYTES:
+            event["json"] = _json_shape(head)
+        elif content_type.startswith("multipart/form-data"):
+            event["parts"] = _multipart_shape(head, content_type)
+        return event
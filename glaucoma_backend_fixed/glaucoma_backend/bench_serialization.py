@@ -0,0 +1,160 @@
+"""
+Compare the old and the fast serialization paths for the list endpoints.
+
+Usage:
+    python bench_serialization.py --rows 5000 --repeat 20
+
+Runs against a throwaway in-memory SQLite database, so it never touches
+glaucoma.db. Both paths must produce identical JSON or the script aborts.
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import schemas
+from app.database import Base
+from app.models import Patient, SupportTicket
+from app.routers.patients import PATIENT_LIST_FIELDS
+from app.serialization import FastJSONResponse, rows_to_dicts
+
+
+def seed(db, rows: int) -> None:
+    start = datetime(2024, 1, 1)
+    for i in range(rows):
+        db.add(
+            Patient(
+                full_name=f"Patient {i}",
+                age=20 + i % 70,
+                gender="F" if i % 2 else "M",
+                medical_history="Hypertension; family history of glaucoma" * (i % 3),
+                risk_factors="IOP 24 mmHg" if i % 4 else None,
+                mrn=f"MRN-{i:06d}",
+            )
+        )
+        db.add(
+            SupportTicket(
+                name=f"Dr {i}",
+                email=f"dr{i}@example.com",
+                issue_type="bug" if i % 2 else "question",
+                message="Prediction page is slow to load. " * 4,
+                created_at=start + timedelta(minutes=i, microseconds=i),
+            )
+        )
+    db.commit()
+
+
+# ---------- patients ----------
+
+def _validate(patient) -> schemas.PatientOut:
+    # What response_model does with an ORM object, on pydantic v1 or v2.
+    if hasattr(schemas.PatientOut, "model_validate"):
+        return schemas.PatientOut.model_validate(patient, from_attributes=True)
+    return schemas.PatientOut.from_orm(patient)
+
+
+def patients_old(db) -> bytes:
+    patients = db.query(Patient).order_by(Patient.id).all()
+    validated = [_validate(p) for p in patients]
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def patients_fast(db) -> bytes:
+    columns = [getattr(Patient, field) for field in PATIENT_LIST_FIELDS]
+    rows = db.query(*columns).order_by(Patient.id).all()
+    return FastJSONResponse(rows_to_dicts(rows, PATIENT_LIST_FIELDS)).body
+
+
+# ---------- tickets ----------
+
+def _ticket_dict(t) -> dict:
+    return {
+        "id": t.id,
+        "subject": f"[{t.issue_type}] {t.name}",
+        "description": t.message,
+        "status": "OPEN",
+        "patient_name": t.name,
+        "doctor_name": None,
+        "priority": "MEDIUM",
+        "created_at": t.created_at,
+        "updated_at": t.created_at,
+    }
+
+
+def tickets_old(db) -> bytes:
+    tickets = db.query(SupportTicket).order_by(SupportTicket.id.desc()).all()
+    return JSONResponse(jsonable_encoder([_ticket_dict(t) for t in tickets])).body
+
+
+def tickets_fast(db) -> bytes:
+    tickets = (
+        db.query(
+            SupportTicket.id,
+            SupportTicket.name,
+            SupportTicket.issue_type,
+            SupportTicket.message,
+            SupportTicket.created_at,
+        )
+        .order_by(SupportTicket.id.desc())
+        .all()
+    )
+    return FastJSONResponse([_ticket_dict(t) for t in tickets]).body
+
+
+def timed(fn, db, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        db.expunge_all()  # don't let the identity map make the ORM path look cheap
+        started = time.perf_counter()
+        fn(db)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, args.rows)
+
+    cases = [
+        ("list_patients", patients_old, patients_fast),
+        ("get_tickets", tickets_old, tickets_fast),
+    ]
+
+    print(f"rows={args.rows} repeat={args.repeat}")
+    print(f"{'endpoint':<15}{'path':<8}{'median ms':>12}{'p95 ms':>10}{'speedup':>10}")
+    for name, old, fast in cases:
+        if json.loads(old(db)) != json.loads(fast(db)):
+            raise SystemExit(f"{name}: fast path output differs from the current path")
+
+        old_ms = timed(old, db, args.repeat)
+        fast_ms = timed(fast, db, args.repeat)
+        old_med = statistics.median(old_ms)
+        fast_med = statistics.median(fast_ms)
+        for label, samples in (("old", old_ms), ("fast", fast_ms)):
+            p95 = sorted(samples)[max(0, int(len(samples) * 0.95) - 1)]
+            speedup = f"{old_med / fast_med:.1f}x" if label == "fast" else ""
+            print(f"{name:<15}{label:<8}{statistics.median(samples):>12.2f}{p95:>10.2f}{speedup:>10}")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Replay a captured traffic trace against local builds and compare latency.
+
+Capture (opt-in, on any deployment):
+    TRAFFIC_CAPTURE_PATH=trace.jsonl uvicorn app.main:app
+
+Replay against one build, or compare two (each is a glaucoma_backend dir):
+    python replay_traffic.py trace.jsonl --build-a ../old_checkout/glaucoma_backend \
+        --build-b . --speedup 4
+
+For each build the tool starts `uvicorn app.main:app` from that directory with
+its database, job queue, scan cache and audit log in a fresh temporary
+directory (removed afterwards) and seeds --seed-patients patients. It then
+re-sends every recorded request at its recorded offset divided by --speedup.
+The trace has no real payloads, so requests are rebuilt from the recorded
+shapes: JSON bodies with the same keys, types and string lengths, and
+synthetic OCT-like images with the same format and dimensions. Path, query
+and form ids are drawn from the seeded patients. The report gives per-route
+p50/p95/p99 for each build and the p99 change from A to B.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+
+# -------------------- request synthesis --------------------
+
+# Stands in for requests that matched no route when captured (the capture
+# doesn't keep their path); it 404s just like they did.
+UNMATCHED_PATH = "/replay-unmatched"
+
+
+def _id_value(name: str, patient_ids: list):
+    return random.choice(patient_ids) if name == "patient_id" and patient_ids else 1
+
+
+def _synthetic_value(name: str, shape, patient_ids: list):
+    if isinstance(shape, str):  # kept verbatim by the capture (numbers, booleans)
+        return shape
+    if "id" in shape:
+        return _id_value(name, patient_ids)
+    if "age" in shape:
+        bucket = shape["age"] or "50-59"
+        return int(bucket.rstrip("+").split("-")[0]) + (0 if bucket.endswith("+") else 5)
+    return "x" * shape.get("len", 1)
+
+
+def _json_value(spec: dict):
+    kind = spec.get("type")
+    if kind == "str":
+        return "x" * spec.get("len", 1)
+    if kind == "int":
+        return 50
+    if kind == "float":
+        return 1.0
+    if kind == "bool":
+        return True
+    if kind == "list":
+        return []
+    if kind == "dict":
+        return {}
+    return None
+
+
+_image_cache = {}
+
+
+def _synthetic_image(fmt: str, width: int, height: int) -> bytes:
+    """Grayscale noise band on black, OCT-like enough to pass the quality gate."""
+    key = (fmt, width, height)
+    if key not in _image_cache:
+        rng = np.random.default_rng(width * 31 + height)
+        pixels = np.zeros((height, width), dtype=np.uint8)
+        top, bottom = height // 3, height // 3 + max(1, height // 4)
+        pixels[top:bottom] = rng.integers(60, 255, (bottom - top, width), dtype=np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(pixels).convert("RGB").save(buf, format=fmt or "PNG")
+        _image_cache[key] = buf.getvalue()
+    return _image_cache[key]
+
+
+def _multipart(parts, patient_ids: list) -> tuple:
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for part in parts:
+        body.write(f"--{boundary}\r\n".encode())
+        if "image" in part or "content_type" in part:
+            image = part.get("image") or {"format": "PNG", "width": 320, "height": 320}
+            ext = (image["format"] or "png").lower()
+            body.write(
+                f'Content-Disposition: form-data; name="{part["name"]}"; filename="scan.{ext}"\r\n'
+                f'Content-Type: {part.get("content_type") or "image/png"}\r\n\r\n'.encode()
+            )
+            body.write(_synthetic_image(image["format"], image["width"], image["height"]))
+        else:
+            body.write(f'Content-Disposition: form-data; name="{part["name"]}"\r\n\r\n'.encode())
+            value = _synthetic_value(part["name"], part.get("value", ""), patient_ids)
+            body.write(str(value).encode())
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+def build_request(event: dict, base_url: str, patient_ids: list) -> urllib.request.Request:
+    path = UNMATCHED_PATH if event["route"] == "<unmatched>" else event["route"]
+    for name in re.findall(r"{(\w+)}", path):
+        path = path.replace("{" + name + "}", str(_id_value(name, patient_ids)))
+    query = "&".join(
+        f"{k}={_synthetic_value(k, v, patient_ids)}" for k, v in event.get("query", {}).items()
+    )
+    url = base_url + path + (f"?{query}" if query else "")
+
+    data, headers = None, {}
+    if event.get("json") is not None:
+        data = json.dumps({k: _json_value(v) for k, v in event["json"].items()}).encode()
+        headers["Content-Type"] = "application/json"
+    elif event.get("parts"):
+        data, headers["Content-Type"] = _multipart(event["parts"], patient_ids)
+    elif event["method"] in ("POST", "PUT", "PATCH"):
+        data = b""
+    return urllib.request.Request(url, data=data, headers=headers, method=event["method"])
+
+
+# -------------------- running a build --------------------
+
+def _wait_ready(base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(base_url + "/ping", timeout=1).read()
+            return
+        except Exception:
+            time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not come up within {timeout}s")
+
+
+def _seed(base_url: str, count: int) -> list:
+    ids = []
+    for i in range(count):
+        payload = json.dumps({"full_name": f"Replay {i}", "age": 40 + i % 40, "gender": "F"}).encode()
+        req = urllib.request.Request(
+            base_url + "/api/patients",
+            data=payload,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        ids.append(json.loads(urllib.request.urlopen(req).read())["id"])
+    return ids
+
+
+def replay_build(build_dir: str, events: list, args) -> dict:
+    """Start `build_dir`, replay `events` against it and return latencies per route."""
+    workdir = tempfile.mkdtemp(prefix="replay-")
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'replay.db')}",
+        JOB_DB_PATH=os.path.join(workdir, "jobs.db"),
+        JOB_SPOOL_DIR=os.path.join(workdir, "job_spool"),
+        # Keep writes out of the checkout, and start every run with a cold cache.
+        DERIVATIVE_CACHE_DIR=os.path.join(workdir, "scan_cache"),
+        AUDIT_DIR=os.path.join(workdir, "audit"),
+    )
+    env.pop("TRAFFIC_CAPTURE_PATH", None)
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=build_dir,
+        env=env,
+    )
+    try:
+        _wait_ready(base_url, args.startup_timeout)
+        patient_ids = _seed(base_url, args.seed_patients)
+
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+
+        def send(event):
+            req = build_request(event, base_url, patient_ids)
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=args.timeout) as resp:
+                    resp.read()
+                    status = resp.status
+            except urllib.error.HTTPError as exc:
+                exc.read()
+                status = exc.code
+            except Exception:
+                status = 0
+            elapsed = (time.perf_counter() - started) * 1000
+            key = f"{event['method']} {event['route']}"
+            with lock:
+                latencies[key].append(elapsed)
+                if status == 0 or status >= 500:
+                    errors[key] += 1
+
+        start = time.monotonic()
+        first = events[0]["t"] if events else 0
+        with ThreadPoolExecutor(max_workers=args.max_in_flight) as pool:
+            for event in events:
+                delay = (event["t"] - first) / args.speedup - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(send, event)
+        return {"latencies": dict(latencies), "errors": dict(errors)}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# -------------------- reporting --------------------
+
+def _pct(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _summary(values) -> str:
+    return f"{len(values):>6} {statistics.median(values):>8.1f} {_pct(values, 95):>8.1f} {_pct(values, 99):>8.1f}"
+
+
+def report(results: dict) -> None:
+    builds = list(results)
+    routes = sorted({route for r in results.values() for route in r["latencies"]})
+    routes.append("ALL")
+    for r in results.values():
+        r["latencies"]["ALL"] = [v for vals in r["latencies"].values() for v in vals]
+
+    header = f"{'route':<45}" + "".join(
+        f" | {b + ' n':>6} {b + ' p50':>8} {b + ' p95':>8} {b + ' p99':>8} {'5xx':>4}"
+        for b in builds
+    )
+    if len(builds) == 2:
+        header += f" | {'p99 Δ':>8}"
+    print(header)
+    print("-" * len(header))
+    for route in routes:
+        line = f"{route[:45]:<45}"
+        p99 = []
+        for build in builds:
+            values = results[build]["latencies"].get(route)
+            errors = sum(results[build]["errors"].values()) if route == "ALL" else results[build]["errors"].get(route, 0)
+            if values:
+                line += f" | {_summary(values)} {errors:>4}"
+                p99.append(_pct(values, 99))
+            else:
+                line += f" | {'-':>6} {'':>8} {'':>8} {'':>8} {'':>4}"
+        if len(builds) == 2 and len(p99) == 2 and p99[0]:
+            line += f" | {(p99[1] - p99[0]) / p99[0] * 100:>+7.1f}%"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("trace", help="JSONL file written by TrafficCaptureMiddleware")
+    parser.add_argument("--build-a", default=".", help="baseline glaucoma_backend directory")
+    parser.add_argument("--build-b", help="candidate glaucoma_backend directory")
+    parser.add_argument("--speedup", type=float, default=1.0, help="replay N times faster than recorded")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed-patients", type=int, default=50)
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    args = parser.parse_args()
+
+    with open(args.trace) as fh:
+        events = sorted((json.loads(line) for line in fh if line.strip()), key=lambda e: e["t"])
+    if args.limit:
+        events = events[: args.limit]
+    print(f"{len(events)} requests, speed-up x{args.speedup}")
+
+    builds = {"A": args.build_a}
+    if args.build_b:
+        builds["B"] = args.build_b
+
+    results = {}
+    for label, build_dir in builds.items():
+        random.seed(0)  # same id choices for both builds
+        print(f"replaying against build {label}: {os.path.abspath(build_dir)}", flush=True)
+        results[label] = replay_build(build_dir, events, args)
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
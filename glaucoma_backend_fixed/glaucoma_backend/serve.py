@@ -0,0 +1,204 @@
+"""
+Pre-fork launcher: several uvicorn workers sharing one listening socket.
+
+Usage:
+    python serve.py --workers 4 --host 0.0.0.0 --port 8000
+
+By default the parent binds the socket and imports only libraries that are
+safe to fork (FastAPI, SQLAlchemy, NumPy, Pillow). It never imports
+TensorFlow. Each worker imports the app after the fork and loads its own copy
+of the model in the background (see the startup hook in app/main.py). This
+guarantees that no TensorFlow runtime state (thread pools, locks) crosses
+fork(). It does not share the model weights: every worker holds its own
+copy. Only the libraries imported in the parent are shared copy-on-write.
+
+--preload-model loads the active model in the parent before forking, so the
+workers inherit the weights copy-on-write. TensorFlow does not support fork()
+once its runtime has executed ops, and loading a .keras model already runs
+ops to create the variables. Workers may therefore hang on their first
+prediction. --warm-in-workers only moves the warm-up prediction after the
+fork; it does not make this safe. Use --preload-model only on a TensorFlow
+build where a multi-worker run has been shown to serve predictions.
+
+With --report-interval N, the parent logs each process's unique vs shared
+memory every N seconds (see app/procstats.py).
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from app.procstats import memory_usage
+
+logger = logging.getLogger("serve")
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, args) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if args.preload_model:
+        from app.database import engine
+
+        # Drop any pooled handle inherited from the parent without closing it
+        # (that would close it for the parent too); the worker opens its own.
+        engine.dispose(close=False)
+    if args.warm_in_workers:
+        from app.predictions.model import registry
+
+        registry.warmup()
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_keep_alive=5)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(app, sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _run_worker(app, sock, args)
+        finally:
+            os._exit(0)
+    logger.info("Started worker pid %d", pid)
+    return pid
+
+
+def _preload_libraries() -> None:
+    # Fork-safe imports only; what the parent can share without TensorFlow.
+    import fastapi  # noqa: F401
+    import numpy  # noqa: F401
+    import PIL.Image  # noqa: F401
+    import pydantic  # noqa: F401
+    import sqlalchemy  # noqa: F401
+
+
+def _preload_model(args):
+    from app.database import engine
+    from app.main import app
+    from app.predictions.model import registry
+
+    started = time.perf_counter()
+    entry = registry.ensure_active(warm=not args.warm_in_workers)
+    logger.info("Model '%s' loaded in parent in %.1fs", entry.name, time.perf_counter() - started)
+
+    # create_all() left a SQLite connection in the pool; SQLite connections
+    # must not be used across fork(), so close it before the workers inherit it.
+    engine.dispose()
+    return app
+
+
+def _report_memory(pids) -> None:
+    rows = []
+    for label, pid in [("parent", os.getpid())] + [("worker", p) for p in sorted(pids)]:
+        try:
+            rows.append((label, memory_usage(pid)))
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    for label, usage in rows:
+        logger.info(
+            "%-6s pid=%-7d rss=%8.1fMB unique=%8.1fMB shared=%8.1fMB pss=%8.1fMB",
+            label,
+            usage["pid"],
+            usage["rss_mb"],
+            usage["unique_mb"],
+            usage["shared_mb"],
+            usage["pss_mb"],
+        )
+    total_rss = sum(u["rss_mb"] for _, u in rows)
+    total_pss = sum(u["pss_mb"] for _, u in rows)
+    logger.info(
+        "total rss=%.1fMB actual (pss)=%.1fMB saved by sharing=%.1fMB",
+        total_rss,
+        total_pss,
+        total_rss - total_pss,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-fork uvicorn launcher")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--report-interval", type=float, default=0, help="seconds; 0 disables")
+    parser.add_argument(
+        "--preload-model",
+        action="store_true",
+        help="load the model in the parent to share its weights (not fork-safe with TensorFlow)",
+    )
+    parser.add_argument(
+        "--warm-in-workers",
+        action="store_true",
+        help="with --preload-model: run the warm-up prediction after fork",
+    )
+    args = parser.parse_args()
+    if args.warm_in_workers and not args.preload_model:
+        parser.error("--warm-in-workers only applies with --preload-model")
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(message)s")
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+
+    sock = _bind(args.host, args.port)
+
+    if args.preload_model:
+        app = _preload_model(args)
+    else:
+        _preload_libraries()
+        app = "app.main:app"  # imported by each worker after the fork
+
+    # Move everything allocated so far out of the GC's generations, so collections
+    # in the workers don't write to (and so un-share) the inherited pages.
+    gc.collect()
+    gc.freeze()
+
+    workers = {_spawn(app, sock, args) for _ in range(args.workers)}
+    stopping = False
+
+    def _stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    next_report = time.monotonic() + args.report_interval
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            workers.discard(pid)
+            if not stopping:
+                logger.warning("Worker %d exited (status %d); restarting", pid, status)
+                workers.add(_spawn(app, sock, args))
+            continue
+        if args.report_interval and time.monotonic() >= next_report:
+            _report_memory(workers)
+            next_report = time.monotonic() + args.report_interval
+        time.sleep(0.5)
+
+    sock.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Sweep TensorFlow runtime settings and measure throughput and tail latency.
+
+Usage:
+    python tf_sweep.py --workers 1,2,4 --intra auto,1,2 --inter 1,2 --xla off,on
+
+Each setting runs in fresh processes, because TensorFlow's thread pools can
+only be sized once per process. For a setting with W workers, W processes run
+at the same time, just as W uvicorn workers would on one node. Each process
+applies the setting through app.predictions.runtime, loads the active model,
+warms it up and then times --requests single-image predictions from
+--concurrency threads, all processes starting together. The table reports aggregate throughput and p50/p99
+latency across all of them. The fastest setting by throughput is marked; use
+its values as INFERENCE_* / WEB_CONCURRENCY.
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+CHILD_FLAG = "--child"
+
+
+# -------------------- child: one worker process --------------------
+
+def run_child(requests: int, concurrency: int) -> None:
+    import numpy as np
+
+    from app.predictions.model import TARGET_SIZE, registry
+    from app.predictions.runtime import active_settings
+
+    entry = registry.ensure_active()
+    inputs = np.random.default_rng(0).random((1, *TARGET_SIZE, 3), dtype=np.float32)
+
+    # Model loading takes different times per process; start timing together.
+    print("ready", flush=True)
+    sys.stdin.readline()
+
+    latencies = []
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def loop():
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            with registry.acquire() as (_, model):
+                started = time.perf_counter()
+                model.predict(inputs, verbose=0)
+                elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=loop) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    # Report what the model actually runs with, not just what was requested.
+    settings = dict(active_settings, jit_compile=bool(entry.model.jit_compile))
+    print(json.dumps({"wall": wall, "latencies": latencies, "settings": settings}))
+
+
+# -------------------- parent: sweep driver --------------------
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_setting(workers: int, intra: str, inter: str, xla: str, onednn: str, precision: str, args):
+    env = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(workers),
+        INFERENCE_INTRA_OP_THREADS="0" if intra == "auto" else intra,
+        INFERENCE_INTER_OP_THREADS="0" if inter == "auto" else inter,
+        INFERENCE_XLA="true" if xla == "on" else "false",
+        INFERENCE_ONEDNN=onednn,
+        INFERENCE_PRECISION=precision,
+        TF_CPP_MIN_LOG_LEVEL="2",
+    )
+    env.pop("OMP_NUM_THREADS", None)
+    cmd = [
+        sys.executable,
+        __file__,
+        CHILD_FLAG,
+        "--requests",
+        str(args.requests),
+        "--concurrency",
+        str(args.concurrency),
+    ]
+    procs = [
+        subprocess.Popen(
+            cmd,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        for _ in range(workers)
+    ]
+    for proc in procs:
+        proc.stdout.readline()  # "ready" (or EOF if the child crashed)
+    for proc in procs:
+        try:
+            proc.stdin.write("go\n")
+            proc.stdin.flush()
+        except BrokenPipeError:
+            pass
+
+    results = []
+    for proc in procs:
+        out, _ = proc.communicate()
+        if proc.returncode != 0:
+            return None
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    latencies = [lat for r in results for lat in r["latencies"]]
+    wall = max(r["wall"] for r in results)
+    return {
+        "settings": results[0]["settings"],
+        "throughput": len(latencies) / wall,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+    }
+
+
+def main() -> None:
+    if CHILD_FLAG in sys.argv:
+        parser = argparse.ArgumentParser()
+        parser.add_argument(CHILD_FLAG, action="store_true")
+        parser.add_argument("--requests", type=int)
+        parser.add_argument("--concurrency", type=int)
+        args = parser.parse_args()
+        run_child(args.requests, args.concurrency)
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", default="1,2", help="worker processes per node")
+    parser.add_argument("--intra", default="auto,1,2", help="intra-op threads (auto = cpus/workers)")
+    parser.add_argument("--inter", default="auto,1,2", help="inter-op threads")
+    parser.add_argument("--xla", default="off", help="off,on")
+    parser.add_argument("--onednn", default="auto", help="auto,on,off")
+    parser.add_argument("--precision", default="float32", help="float32,mixed_bfloat16,mixed_float16")
+    parser.add_argument("--requests", type=int, default=50, help="predictions per worker")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent requests per worker")
+    args = parser.parse_args()
+
+    grid = itertools.product(
+        [int(w) for w in args.workers.split(",")],
+        args.intra.split(","),
+        args.inter.split(","),
+        args.xla.split(","),
+        args.onednn.split(","),
+        args.precision.split(","),
+    )
+
+    header = f"{'workers':>7} {'intra':>5} {'inter':>5} {'xla':>4} {'onednn':>6} {'precision':>15} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}"
+    print(header)
+    print("-" * len(header))
+    rows = []
+    for workers, intra, inter, xla, onednn, precision in grid:
+        result = run_setting(workers, intra, inter, xla, onednn, precision, args)
+        if result is None:
+            print(f"{workers:>7} {intra:>5} {inter:>5} {xla:>4} {onednn:>6} {precision:>15}   failed")
+            continue
+        s = result["settings"]
+        rows.append(result)
+        print(
+            f"{workers:>7} {s['intra_op_threads']:>5} {s['inter_op_threads']:>5} "
+            f"{'on' if s['jit_compile'] else 'off':>4} {'on' if s['onednn'] else 'off':>6} {s['precision']:>15} "
+            f"{result['throughput']:>8.1f} {result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f}",
+            flush=True,
+        )
+
+    if rows:
+        best = max(rows, key=lambda r: r["throughput"])
+        print(f"\nbest throughput: {json.dumps(best['settings'])}")
+
+
+if __name__ == "__main__":
+    main()